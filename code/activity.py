@@ -0,0 +1,67 @@
+from settings import *
+from spatial import SpatialHash
+from entities import Entity
+
+# activity regions: sprites that actually do something in update() are bucketed into regions of
+# ACTIVITY_REGION_SIZE, and only the ones in regions near the camera are updated each tick.
+# a sprite that falls asleep remembers when, and on waking gets a single update with all the time it
+# missed, which is all AnimatedSprite (it reads the shared clock) or a future walking npc needs to catch up
+
+class ActivityScheduler:
+    def __init__(self, region_size = ACTIVITY_REGION_SIZE, margin = ACTIVITY_MARGIN):
+        self.regions = SpatialHash(region_size)
+        self.margin = margin
+        self.time = 0
+        self.awake = {}
+        self.asleep_since = {}
+        self.active_cells = None
+        self.active = []
+
+    @staticmethod
+    def updates(sprite):
+        # sprites still on the no-op Sprite.update never need a tick
+        return type(sprite).update is not pygame.sprite.Sprite.update
+
+    def add(self, sprite):
+        if self.updates(sprite):
+            self.regions.insert(sprite, sprite.rect)
+            self.active_cells = None
+
+    def remove(self, sprite):
+        if sprite in self.regions:
+            self.regions.remove(sprite)
+            self.awake.pop(sprite, None)
+            self.asleep_since.pop(sprite, None)
+            self.active_cells = None
+
+    def update(self, dt, view = None):
+        self.time += dt
+        if view is None:
+            sprites = list(self.regions.items)
+        else:
+            # the set of active regions only changes when the camera crosses a region border
+            cells = self.regions.cells_for(view.inflate(self.margin * 2, self.margin * 2))
+            if cells != self.active_cells:
+                self.active_cells = cells
+                self.active = self.regions.query_cells(cells)
+            sprites = self.active
+
+        awake = {}
+        for sprite in sprites:
+            if sprite in self.awake:
+                sprite.update(dt)
+            else:
+                # waking up: catch up on everything missed while asleep in one step
+                sprite.update(self.time - self.asleep_since.pop(sprite, self.time - dt))
+            awake[sprite] = None
+            # entities change region as they walk
+            if isinstance(sprite, Entity) and self.regions.cells_for(sprite.rect) != self.regions.items[sprite]:
+                self.regions.remove(sprite)
+                self.regions.insert(sprite, sprite.rect)
+                self.active_cells = None
+
+        for sprite in self.awake:
+            if sprite not in awake:
+                self.asleep_since[sprite] = self.time
+        self.awake = awake
+        return len(sprites)
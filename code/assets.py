@@ -0,0 +1,75 @@
+from settings import *
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha1
+from os import cpu_count, makedirs, replace, stat
+from os.path import normpath
+from threading import get_ident
+import struct
+from pack import packed_pixels, packed, open_asset
+
+# png decoding runs on a thread pool and the decoded rgba pixels are cached on disk keyed by path + mtime,
+# so only the conversion to display format (convert/convert_alpha) is left on the main thread.
+# packed images come from the mapped asset pack (inflated pixels, or a png decoded from memory), without
+# touching the file or the cache
+
+IMAGE_CACHE_VERSION = 1
+HEADER = struct.Struct('<4sIqqII')
+
+executor = ThreadPoolExecutor(max_workers = cpu_count() or 4, thread_name_prefix = 'image-decode')
+
+def cache_file(path):
+    return join(IMAGE_CACHE_DIR, sha1(normpath(path).encode()).hexdigest() + '.rgba')
+
+def read_cached(path, info):
+    try:
+        with open(cache_file(path), 'rb') as f:
+            magic, version, mtime, size, width, height = HEADER.unpack(f.read(HEADER.size))
+            if (magic, version, mtime, size) != (b'KIMG', IMAGE_CACHE_VERSION, info.st_mtime_ns, info.st_size):
+                return None
+            pixels = f.read()
+    except (OSError, struct.error):
+        return None
+    return ((width, height), pixels) if len(pixels) == width * height * 4 else None
+
+def write_cached(path, info, size, pixels):
+    target = cache_file(path)
+    temp = f'{target}.{get_ident()}.tmp'
+    try:
+        makedirs(IMAGE_CACHE_DIR, exist_ok = True)
+        with open(temp, 'wb') as f:
+            f.write(HEADER.pack(b'KIMG', IMAGE_CACHE_VERSION, info.st_mtime_ns, info.st_size, *size))
+            f.write(pixels)
+        replace(temp, target)
+    except OSError as e:
+        print('image cache write error', e)
+
+def decode(path):
+    pixels = packed_pixels(path)
+    if pixels:
+        return pixels
+    if packed(path):
+        surf = pygame.image.load(open_asset(path), path)
+        return surf.get_size(), pygame.image.tobytes(surf, 'RGBA')
+    info = stat(path)
+    cached = read_cached(path, info)
+    if cached:
+        return cached
+    surf = pygame.image.load(path)
+    size, pixels = surf.get_size(), pygame.image.tobytes(surf, 'RGBA')
+    write_cached(path, info, size, pixels)
+    return size, pixels
+
+def decode_images(paths):
+    # safe on any thread, nothing here touches the display
+    return list(executor.map(decode, paths))
+
+def convert_images(decoded, alpha = True):
+    # main thread only
+    surfs = []
+    for size, pixels in decoded:
+        surf = pygame.image.frombuffer(pixels, size, 'RGBA')
+        surfs.append(surf.convert_alpha() if alpha else surf.convert())
+    return surfs
+
+def load_images(paths, alpha = True):
+    return convert_images(executor.map(decode, paths), alpha)
@@ -0,0 +1,158 @@
+import os
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import argparse
+from statistics import quantiles
+from time import perf_counter
+from settings import *
+from kaugame import Game
+
+# headless benchmark for the Kaugame frame loop: replays a scripted walk around world.tmx and through
+# the transitions into house, hospital and the arenas, then reports per phase timings
+# usage (from code/): python benchmark.py [--save-baseline] [--baseline benchmark_baseline.json] [--require-baseline] [--backend texture]
+# the committed benchmark_baseline.json is a reference run, save a baseline on your own machine for tighter checks
+
+DT = 1 / 60
+BASELINE_PATH = join(dirname(__file__), 'benchmark_baseline.json')
+
+# (map, spawn pos) legs, each one is entered through a real fade transition
+ROUTE = [
+    ('house', 'world'), ('world', 'house'),
+    ('hospital', 'world'), ('world', 'hospital'),
+    ('fire', 'entrance'), ('world', 'fire'),
+    ('plant', 'entrance'), ('world', 'plant'),
+    ('water', 'entrance'), ('world', 'water'),
+    ('arena', 'entrance'), ('world', 'fire'),
+]
+WALK = [(pygame.K_UP, 40), (pygame.K_LEFT, 60), (pygame.K_DOWN, 40), (pygame.K_RIGHT, 60), (None, 20)]
+
+class ScriptedKeys:
+    def __init__(self):
+        self.held = None
+
+    def get_pressed(self):
+        return self
+
+    def __getitem__(self, key):
+        return key == self.held
+
+class Timings:
+    def __init__(self):
+        self.samples = {}
+
+    def add(self, name, seconds):
+        self.samples.setdefault(name, []).append(seconds * 1000)
+
+    def timed(self, name, func):
+        def wrapper(*args, **kwargs):
+            start = perf_counter()
+            result = func(*args, **kwargs)
+            self.add(name(*args) if callable(name) else name, perf_counter() - start)
+            return result
+        return wrapper
+
+    def summary(self):
+        report = {}
+        for name, values in self.samples.items():
+            if len(values) > 1:
+                cuts = quantiles(values, n = 100, method = 'inclusive')
+                report[name] = {'p50': cuts[49], 'p99': cuts[98], 'count': len(values)}
+            else:
+                report[name] = {'p50': values[0], 'p99': values[0], 'count': 1}
+        return report
+
+def run_frame(game, timings):
+    start = perf_counter()
+    for event in pygame.event.get():
+        pass
+    update_start = perf_counter()
+    alpha = game.advance(DT)
+    draw_start = perf_counter()
+    game.draw(alpha)
+    game.renderer.present()
+    end = perf_counter()
+    timings.add('update', draw_start - update_start)
+    timings.add('draw', end - draw_start)
+    timings.add('frame', end - start)
+
+def run_benchmark(backend = RENDER_BACKEND):
+    timings = Timings()
+    keys = ScriptedKeys()
+    pygame.key.get_pressed = keys.get_pressed
+
+    # Game.__init__ imports assets and sets up the first map, so time those methods directly
+    Game.import_assets = timings.timed('startup:import_assets', Game.import_assets)
+    Game.setup = timings.timed(lambda game, map_name, *args: f'setup:{map_name}', Game.setup)
+    Game.tint_screen = timings.timed('tint_screen', Game.tint_screen)
+    start = perf_counter()
+    # no world save, every run starts from the same spot
+    game = Game(save_path = None, backend = backend)
+    timings.add('startup:total', perf_counter() - start)
+
+    for map_name, pos in ROUTE:
+        # walk the scripted path on the current map
+        for key, frames in WALK:
+            keys.held = key
+            for _ in range(frames):
+                run_frame(game, timings)
+        keys.held = None
+
+        # then fade out, set up the next map and fade back in
+        game.player.block()
+        game.transition_target = (map_name, pos)
+        game.tint_mode = 'tint'
+        tint_calls = len(timings.samples['tint_screen'])
+        while game.tint_mode == 'tint' or game.tint_progress > 0:
+            run_frame(game, timings)
+        # fade bookkeeping plus the setup it triggers, summed over the whole transition
+        timings.add('transition', sum(timings.samples['tint_screen'][tint_calls:]) / 1000)
+    return timings.summary()
+
+def compare(report, baseline, tolerance):
+    regressions = []
+    for name, stats in baseline.items():
+        if name not in report:
+            continue
+        for key in ('p50', 'p99'):
+            # a small absolute slack keeps sub-millisecond phases from flapping
+            limit = stats[key] * (1 + tolerance) + 0.25
+            if report[name][key] > limit:
+                regressions.append(f'{name} {key}: {report[name][key]:.2f}ms > {limit:.2f}ms (baseline {stats[key]:.2f}ms)')
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Headless Kaugame frame loop benchmark')
+    parser.add_argument('--baseline', default = BASELINE_PATH)
+    parser.add_argument('--save-baseline', action = 'store_true')
+    parser.add_argument('--tolerance', type = float, default = 0.25)
+    # for checks: a missing baseline fails instead of only printing a note
+    parser.add_argument('--require-baseline', action = 'store_true')
+    parser.add_argument('--backend', choices = ('software', 'texture'), default = RENDER_BACKEND)
+    args = parser.parse_args()
+
+    report = run_benchmark(args.backend)
+    print(f"{'phase':<24}{'p50 ms':>10}{'p99 ms':>10}{'count':>8}")
+    for name, stats in sorted(report.items()):
+        print(f"{name:<24}{stats['p50']:>10.2f}{stats['p99']:>10.2f}{stats['count']:>8}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print('baseline saved to', args.baseline)
+    elif exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print('regressions against', args.baseline)
+            for line in regressions:
+                print('  ' + line)
+            exit(1)
+        print('no regressions against', args.baseline)
+    else:
+        print('no baseline at', args.baseline, '(run with --save-baseline to create one)')
+        if args.require_baseline:
+            exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,5 @@
 from settings import *
+from profiler import PROFILER
 
 class Entity(pygame.sprite.Sprite):
     def __init__(self, pos, frames, groups, facing_direction):
@@ -22,6 +23,22 @@ class Entity(pygame.sprite.Sprite):
         self.hitbox = self.rect.inflate(-self.rect.width * 0.5, -60)
 
         self.y_sort = self.rect.centery
+        self.previous_pos = vector(self.rect.topleft)
+
+    def render_pos(self, alpha):
+        # position between the last two simulation steps, for smooth rendering
+        return self.previous_pos.lerp(self.rect.topleft, alpha)
+
+    def render_center(self, alpha):
+        return self.render_pos(alpha) + vector(self.rect.size) / 2
+
+    def place(self, center, facing_direction):
+        # jump straight to a new spot, without interpolating from the old one
+        self.rect.center = center
+        self.hitbox.center = self.rect.center
+        self.previous_pos.update(self.rect.topleft)
+        self.y_sort = self.rect.centery
+        self.facing_direction = facing_direction
 
     def animate(self, dt):
         self.frame_index += ANIMATION_SPEED * dt
@@ -45,9 +62,9 @@ class Entity(pygame.sprite.Sprite):
         self.blocked = False
 
 class Player(Entity):
-    def __init__(self, pos, frames, groups, facing_direction, collision_sprites):
+    def __init__(self, pos, frames, groups, facing_direction, collision_index):
         super().__init__(pos, frames, groups, facing_direction)
-        self.collision_sprites = collision_sprites
+        self.collision_index = collision_index
         self.at_home = False
 
     def input(self):
@@ -76,7 +93,9 @@ class Player(Entity):
 
 
     def collisions(self, axis):
-        for sprite in self.collision_sprites:
+        candidates = self.collision_index.nearby(self.hitbox)
+        PROFILER.count('collision checks', len(candidates))
+        for sprite in candidates:
             if sprite.hitbox.colliderect(self.hitbox):
                 # horizontal collision
                 if axis == 'horizontal':
@@ -110,6 +129,7 @@ class Player(Entity):
 
 
     def update(self, dt):
+        self.previous_pos.update(self.rect.topleft)
         self.y_sort = self.rect.centery
         if not self.blocked:
             self.input()
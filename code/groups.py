@@ -1,24 +1,155 @@
 from settings import *
+from bisect import bisect_left
+from math import floor
 from support import import_image
 from entities import Entity
+from spatial import SpatialHash
+from activity import ActivityScheduler
+from profiler import PROFILER
 
 class AllSprites(pygame.sprite.Group):
-    def __init__(self):
+    def __init__(self, renderer):
         super().__init__()
-        self.display_surface = pygame.display.get_surface()
+        self.renderer = renderer
         self.offset = vector()
         self.shadow_surf = import_image('..','graphics','other', 'shadow')
+        self.shadow_offset = (40, 110)
 
-    def draw(self, player_center):
+        # per z layer buckets: static sprites live in a spatial hash, entities in a plain dict
+        self.static_layers = {}
+        self.moving_layers = {}
+        self.layer_order = []
+        self.placed = {}
+        # whole pixel top left of each static sprite, worked out once when it is bucketed
+        self.positions = {}
+        self.pending = {}
+        self.insert_count = 0
+
+        # persistent depth order of the main layer: static sprites are ranked by (y_sort, insertion order)
+        # once per flush, each entity keeps the slot among those ranks its own key falls into and only
+        # bisects for a new one when its y_sort changes
+        self.main_keys = []
+        self.main_ranks = {}
+        self.entity_slots = {}
+
+        # only sprites near the camera are updated
+        self.activity = ActivityScheduler()
+
+    def add_internal(self, sprite, layer = None):
+        super().add_internal(sprite, layer)
+        # sprites join their groups before their rect exists, so bucket them on the next draw
+        self.pending[sprite] = None
+
+    def remove_internal(self, sprite):
+        super().remove_internal(sprite)
+        if sprite in self.pending:
+            del self.pending[sprite]
+            return
+        z, _ = self.placed.pop(sprite)
+        self.activity.remove(sprite)
+        if isinstance(sprite, Entity):
+            del self.moving_layers[z][sprite]
+            self.entity_slots.pop(sprite, None)
+        else:
+            self.static_layers[z].remove(sprite)
+            del self.positions[sprite]
+            # the remaining ranks keep their relative order, so no re-sort is needed
+            self.main_ranks.pop(sprite, None)
+
+    def flush(self):
+        main = WORLD_LAYERS['main']
+        new_main = False
+        for sprite in self.pending:
+            self.placed[sprite] = (sprite.z, self.insert_count)
+            self.insert_count += 1
+            self.activity.add(sprite)
+            if isinstance(sprite, Entity):
+                self.moving_layers.setdefault(sprite.z, {})[sprite] = None
+            else:
+                self.static_layers.setdefault(sprite.z, SpatialHash(RENDER_CELL_SIZE)).insert(sprite, sprite.rect)
+                self.positions[sprite] = (floor(sprite.rect.x), floor(sprite.rect.y))
+                new_main = new_main or sprite.z == main
+        self.pending.clear()
+        self.layer_order = sorted(set(self.static_layers) | set(self.moving_layers))
+
+        if new_main:
+            # static sprites never move, so the main layer is sorted here once instead of every frame
+            ranked = sorted(self.static_layers[main].items, key = lambda sprite: (sprite.y_sort, self.placed[sprite][1]))
+            self.main_keys = [(sprite.y_sort, self.placed[sprite][1]) for sprite in ranked]
+            self.main_ranks = {sprite: rank for rank, sprite in enumerate(ranked)}
+            self.entity_slots.clear()
+
+    def entity_slot(self, sprite):
+        key = (sprite.y_sort, self.placed[sprite][1])
+        slot = self.entity_slots.get(sprite)
+        if slot is None or slot[0] != key:
+            # number of static sprites drawn before this entity
+            slot = self.entity_slots[sprite] = (key, bisect_left(self.main_keys, key))
+        return slot
+
+    def visible_main(self, z, view):
+        sprites = [sprite for sprite in self.static_layers[z].query(view) if view.colliderect(sprite.rect)] if z in self.static_layers else []
+        sprites.sort(key = self.main_ranks.__getitem__)
+        if z in self.moving_layers:
+            entity_view = view.inflate(0, self.shadow_surf.get_height() * 2)
+            entities = sorted((self.entity_slot(sprite), sprite) for sprite in self.moving_layers[z] if entity_view.colliderect(sprite.rect))
+            ranks = [self.main_ranks[sprite] for sprite in sprites]
+            # back to front so the indices worked out on ranks stay valid while inserting
+            for ((key, slot), sprite) in reversed(entities):
+                sprites.insert(bisect_left(ranks, slot), sprite)
+        return sprites
+
+    def visible(self, z, view):
+        if z == WORLD_LAYERS['main']:
+            return self.visible_main(z, view)
+        sprites = []
+        if z in self.static_layers:
+            sprites.extend(sprite for sprite in self.static_layers[z].query(view) if view.colliderect(sprite.rect))
+        if z in self.moving_layers:
+            # entities also cast a shadow just below their rect
+            entity_view = view.inflate(0, self.shadow_surf.get_height() * 2)
+            sprites.extend(sprite for sprite in self.moving_layers[z] if entity_view.colliderect(sprite.rect))
+        sprites.sort(key = lambda sprite: self.placed[sprite][1])
+        return sprites
+
+    def update(self, dt, center = None):
+        # without a center every sprite counts as near
+        if self.pending:
+            self.flush()
+        view = pygame.FRect(0, 0, WINDOW_WIDTH, WINDOW_HEIGHT).move_to(center = center) if center else None
+        return self.activity.update(dt, view)
+
+    def draw(self, player_center, alpha = 1):
         self.offset.x = -(player_center[0] - WINDOW_WIDTH / 2)
         self.offset.y = -(player_center[1] - WINDOW_HEIGHT / 2)
+        if self.pending:
+            self.flush()
 
-        bg_sprites = [sprite for sprite in self if sprite.z < WORLD_LAYERS['main']]
-        main_sprites = sorted([sprite for sprite in self if sprite.z == WORLD_LAYERS['main']], key= lambda sprite: sprite.y_sort)
-        fg_sprites = [sprite for sprite in self if sprite.z > WORLD_LAYERS['main']]
-
-        for layer in (bg_sprites, main_sprites, fg_sprites):
-            for sprite in layer:
-                if isinstance(sprite, Entity):
-                    self.display_surface.blit(self.shadow_surf, sprite.rect.topleft + self.offset + vector(40,110))
-                self.display_surface.blit(sprite.image, sprite.rect.topleft + self.offset)
+        # only sprites that overlap the camera are sorted and blitted, one Surface.blits call per layer
+        view = pygame.FRect(-self.offset.x, -self.offset.y, WINDOW_WIDTH, WINDOW_HEIGHT)
+        # whole pixel offsets, floored once per frame: blits truncates float dests toward zero, which would
+        # shift anything starting above or left of the screen 1px. static sprites add them to their
+        # precomputed whole pixel positions, only entities are floored per frame
+        ox, oy = floor(self.offset.x), floor(self.offset.y)
+        positions = self.positions
+        shadow, (shadow_x, shadow_y) = self.shadow_surf, self.shadow_offset
+        blitted = 0
+        for z in self.layer_order:
+            sprites = self.visible(z, view)
+            blitted += len(sprites)
+            if z not in self.moving_layers:
+                blits = [(sprite.image, (positions[sprite][0] + ox, positions[sprite][1] + oy)) for sprite in sprites]
+            else:
+                blits = []
+                for sprite in sprites:
+                    if isinstance(sprite, Entity):
+                        x, y = sprite.render_pos(alpha)
+                        x, y = floor(x) + ox, floor(y) + oy
+                        blits.append((shadow, (x + shadow_x, y + shadow_y)))
+                        blits.append((sprite.image, (x, y)))
+                    else:
+                        x, y = positions[sprite]
+                        blits.append((sprite.image, (x + ox, y + oy)))
+            self.renderer.blits(blits)
+        PROFILER.count('sprites blitted', blitted)
+        PROFILER.count('sprites culled', len(self) - blitted)
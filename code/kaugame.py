@@ -1,117 +1,224 @@
 from settings import *
-from pytmx.util_pygame import load_pygame
 from os.path import join
 
-from sprites import Sprite, AnimatedSprite, MonsterPatchSprite, BorderSprite, CollidableSprite, TransitionSprite
+from sprites import Sprite, AnimatedSprite, AnimationClock, TerrainCache, TerrainChunk, MonsterPatchSprite, Border, CollidableSprite, TransitionZone
 from entities import Player, RandoGuys
-from groups import AllSprites
+from worldcache import WorldInstance, WorldCache
+from maploader import MapLoader
+from profiler import PROFILER, ProfilerOverlay
+from savegame import SaveFile
+from render import create_renderer
 from pet import Pet
 
 from support import *
 
 class Game:
-    def __init__(self):
+    def __init__(self, save_path = WORLD_SAVE_PATH, backend = RENDER_BACKEND):
         pygame.init()
-        self.display_surface = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
-        pygame.display.set_caption('Kaugame')
+        self.renderer = create_renderer((WINDOW_WIDTH, WINDOW_HEIGHT), 'Kaugame', backend)
+        # None with the texture renderer, which has no display surface to draw on
+        self.display_surface = self.renderer.surface
         self.clock = pygame.time.Clock()
 
-        #groups
-        self.all_sprites = AllSprites()
-        self.collision_sprites = pygame.sprite.Group()
-        self.transition_sprites = pygame.sprite.Group()
+        # built maps, setup points all_sprites, colliders, transition_zones, collision_index and player at the active one
+        self.worlds = WorldCache(release = self.release_map)
+        self.animation_clock = AnimationClock()
+        # baked terrain chunks of every world, only the recently drawn ones are kept
+        self.terrain_cache = TerrainCache()
 
         # transition
         self.transition_target = None
-        self.tint_surf = pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT))
         self.tint_mode = 'nah'
         self.tint_progress = 0
         self.tint_direction = -1
         self.tint_speed = 400
 
+        # fixed timestep: leftover frame time not yet simulated
+        self.accumulator = 0
+
+        # debug overlay (F3)
+        self.profiler_overlay = ProfilerOverlay(self.renderer)
+
+        # world save (map, player position and facing), journaled while playing, None turns saving off
+        self.save_file = SaveFile(save_path) if save_path else None
+        self.save_timer = 0
+
         self.import_assets()
-        # self.setup(self.tmx_maps['hospital'],'world')
-        self.setup(self.tmx_maps['world'],'house')
+        state = self.load_world()
+        if state.get('map') in self.tmx_maps.paths:
+            self.setup(state['map'], state['spawn'])
+            self.restore_player(state)
+        else:
+            # self.setup('hospital','world')
+            self.setup('world','house')
     
     def import_assets(self):
-        self.tmx_maps = tmx_importer(join('..','data', 'maps'))
+        # maps load lazily, and the ones reachable from the current map are prefetched in the background
+        self.tmx_maps = MapLoader('..','data', 'maps', prebuild = self.prebuild_map)
         
-        self.overworld_frames = {
+        # every overworld frame ends up in a handful of atlas pages
+        self.overworld_frames = pack_atlas({
             'water': import_folder("..","graphics", "tilesets","water"),
             'coast': coast_importer(24, 12, '..','graphics','tilesets','coast'),
             'characters': all_character_import('..','graphics',"characters"),
-        }
+        })
+        self.water_sheets = tiled_frames(self.overworld_frames['water'], WATER_CHUNK_SIZE)
 
-    def setup(self, tmx_map, player_start_pos):
-        
-        # Clear (char, eTc)
-        for group in (self.all_sprites, self.collision_sprites, self.transition_sprites):
-            group.empty()
+    def prebuild_map(self, tmx_map):
+        tmx_map.terrain = terrain_chunks(tmx_map, ['Terrain','Terrain Top'])
+
+    def setup(self, map_name, player_start_pos):
+        # recently visited maps are still built, entering one again only moves the player to the spawn point
+        self.worlds.active = map_name
+        world = self.worlds.get(map_name)
+        if world:
+            self.place_player(world, player_start_pos)
+        else:
+            world = self.build_world(map_name, player_start_pos)
+            self.worlds.add(world)
 
-        # Terrain Tiles
-        for layer in ['Terrain','Terrain Top']:
-            for x, y, surf in tmx_map.get_layer_by_name(layer).tiles():
-                Sprite((x * TILE_SIZE, y * TILE_SIZE), surf, self.all_sprites, WORLD_LAYERS['bg'])
+        self.all_sprites, self.colliders, self.transition_zones = world.all_sprites, world.colliders, world.transition_zones
+        self.collision_index, self.triggers, self.player = world.collision_index, world.triggers, world.player
+        # the player starts over at a spawn point, so every zone it stands in there is entered anew
+        self.triggers.reset()
+        self.map_name, self.spawn = map_name, player_start_pos
 
-        # Water
+        self.tmx_maps.prefetch(zone.target[0] for zone in self.transition_zones if zone.target[0] not in self.worlds)
+        self.save_world()
+
+    def release_map(self, map_name):
+        # an evicted world takes its loaded map (and its terrain layout) with it
+        self.tmx_maps.release(map_name)
+
+    def place_player(self, world, player_start_pos):
+        # unknown spawn point, start at the map's first one like build_world does
+        center, facing_direction = world.spawns.get(player_start_pos) or next(iter(world.spawns.values()))
+        player = world.player
+        player.place(center, facing_direction)
+        # fresh and standing still, like a newly built player
+        player.direction = vector()
+        player.frame_index = 0
+        player.image = player.frames[player.get_state()][0]
+        player.unblock()
+
+    def build_world(self, map_name, player_start_pos):
+        tmx_map = self.tmx_maps.get(map_name)
+        world = WorldInstance(map_name, self.renderer)
+
+        # Terrain Tiles (grouped into chunks per map load, each baked when it first comes into view)
+        for pos, (size, tiles) in tmx_map.terrain.items():
+            TerrainChunk(pos, size, tiles, world.all_sprites, self.terrain_cache)
+
+        # Water (one sprite per block of up to WATER_CHUNK_SIZE tiles, cut from the shared tiled frames)
+        step = WATER_CHUNK_SIZE * TILE_SIZE
         for obj in tmx_map.get_layer_by_name('Water'):
-            for x in range(int(obj.x), int(obj.x+obj.width), TILE_SIZE):
-                for y in range(int(obj.y), int(obj.y +obj.height), TILE_SIZE):
-                    AnimatedSprite((x,y), self.overworld_frames['water'], self.all_sprites, WORLD_LAYERS['water'])
+            left, top = int(obj.x), int(obj.y)
+            right = left + len(range(left, int(obj.x+obj.width), TILE_SIZE)) * TILE_SIZE
+            bottom = top + len(range(top, int(obj.y +obj.height), TILE_SIZE)) * TILE_SIZE
+            for x in range(left, right, step):
+                for y in range(top, bottom, step):
+                    size = (min(step, right - x), min(step, bottom - y))
+                    frames = [sheet.subsurface((0,0), size) for sheet in self.water_sheets]
+                    AnimatedSprite((x,y), frames, world.all_sprites, WORLD_LAYERS['water'], self.animation_clock)
 
         #Coast
-            for obj in tmx_map.get_layer_by_name('Coast'):
-                terrain = obj.properties['terrain']
-                side = obj.properties['side']
-                AnimatedSprite((obj.x,obj.y), self.overworld_frames['coast'][terrain][side], self.all_sprites, WORLD_LAYERS['bg'])
+        for obj in tmx_map.get_layer_by_name('Coast'):
+            terrain = obj.properties['terrain']
+            side = obj.properties['side']
+            AnimatedSprite((obj.x,obj.y), self.overworld_frames['coast'][terrain][side], world.all_sprites, WORLD_LAYERS['bg'], self.animation_clock)
 
         # Objects
         for obj in tmx_map.get_layer_by_name('Objects'):
             if obj.name == 'top':
-                Sprite((obj.x, obj.y), obj.image, self.all_sprites, WORLD_LAYERS['top'])
+                Sprite((obj.x, obj.y), obj.image, world.all_sprites, WORLD_LAYERS['top'])
             else:
-                CollidableSprite((obj.x, obj.y), obj.image, (self.all_sprites, self.collision_sprites))
+                world.colliders.append(CollidableSprite((obj.x, obj.y), obj.image, world.all_sprites))
 
         # Transition objects
         for obj in tmx_map.get_layer_by_name('Transition'):
-            TransitionSprite((obj.x, obj.y), (obj.width, obj.height), (obj.properties["target"], obj.properties["pos"]), self.transition_sprites)
+            zone = TransitionZone((obj.x, obj.y), (obj.width, obj.height), (obj.properties["target"], obj.properties["pos"]))
+            world.transition_zones.append(zone)
+            world.triggers.add(zone, 'transition', zone.target)
 
         # Collision objects
         for obj in tmx_map.get_layer_by_name('Collisions'):
-            BorderSprite((obj.x, obj.y), pygame.Surface((obj.width, obj.height)), self.collision_sprites)
+            world.colliders.append(Border((obj.x, obj.y), (obj.width, obj.height)))
 
         # Green stuff
         for obj in tmx_map.get_layer_by_name('Monsters'):
-            MonsterPatchSprite((obj.x,obj.y), obj.image, self.all_sprites, obj.properties['biome'])
+            patch = MonsterPatchSprite((obj.x,obj.y), obj.image, world.all_sprites, obj.properties['biome'])
+            world.triggers.add(patch, 'monsters', patch.biome)
 
         # Entities
         for obj in tmx_map.get_layer_by_name('Entities'):
             if obj.name == 'Player': 
+                world.spawns[obj.properties['pos']] = ((obj.x, obj.y), obj.properties.get('direction','down'))
                 if obj.properties['pos'] == player_start_pos:
-                    print(obj.x,obj.y)
-                    self.player = Player(
+                    world.player = Player(
                         pos = (obj.x, obj.y), 
                         frames = self.overworld_frames['characters']['player'],
-                        groups = self.all_sprites,
+                        groups = world.all_sprites,
                         facing_direction=obj.properties.get('direction','down'),
-                        collision_sprites=self.collision_sprites)
+                        collision_index=world.collision_index)
             else:
-                RandoGuys(
+                world.colliders.append(RandoGuys(
                     pos = (obj.x, obj.y), 
                     frames = self.overworld_frames['characters'][obj.properties['graphic']], 
-                    groups = (self.all_sprites, self.collision_sprites),
-                    facing_direction = obj.properties['direction'] if 'direction' in obj.properties else 'down')
+                    groups = world.all_sprites,
+                    facing_direction = obj.properties['direction'] if 'direction' in obj.properties else 'down'))
+
+        if world.player is None:
+            # unknown spawn point, start at the map's first one
+            center, facing_direction = next(iter(world.spawns.values()))
+            world.player = Player(center, self.overworld_frames['characters']['player'], world.all_sprites, facing_direction, world.collision_index)
 
-        if(tmx_map == self.tmx_maps['house']):
-            self.player.at_home = True
+        # static hitboxes never move, so they are hashed once per map
+        world.collision_index.build(world.colliders)
+
+        if(map_name == 'house'):
+            world.player.at_home = True
         else:
-            self.player.at_home = False
+            world.player.at_home = False
+
+        world.estimate_size()
+        return world
+
+    def load_world(self):
+        if self.save_file:
+            try:
+                return self.save_file.load()
+            except Exception as e:
+                print('load error', e)
+        return {}
+
+    def restore_player(self, state):
+        self.player.place(state.get('pos', self.player.rect.center), state.get('facing', self.player.facing_direction))
+        # setup already journaled the spawn point, put the restored position back on top of it
+        self.save_world()
+
+    def save_world(self, close = False):
+        # only the values that changed since the last call end up in the journal
+        if self.save_file:
+            try:
+                self.save_file.record({
+                    'map': self.map_name,
+                    'spawn': self.spawn,
+                    'pos': [round(self.player.rect.centerx, 1), round(self.player.rect.centery, 1)],
+                    'facing': self.player.facing_direction})
+                if close:
+                    self.save_file.close()
+            except Exception as e:
+                print('save error', e)
 
     def transition_check(self):
-        sprites = [sprite for sprite in self.transition_sprites if sprite.rect.colliderect(self.player.hitbox)]
-        if sprites:
+        # only the zones near the player's hitbox are tested, monster patch occupancy per biome is kept
+        # up to date on the way for the encounter system (self.triggers.occupancy('monsters'))
+        events = self.triggers.update(self.player.hitbox)
+        PROFILER.count('trigger events', len(events))
+        zones = self.triggers.inside('transition')
+        if zones:
             self.player.block()
-            self.transition_target = sprites[0].target
+            self.transition_target = zones[0].target
             self.tint_mode = 'tint'
     
     def tint_screen(self, dt):
@@ -120,32 +227,75 @@ class Game:
         if self.tint_mode == 'tint':
             self.tint_progress += self.tint_speed * dt
             if self.tint_progress >= 255:
-                self.setup(self.tmx_maps[self.transition_target[0]], self.transition_target[1])
+                self.setup(self.transition_target[0], self.transition_target[1])
                 self.tint_mode = 'nah'
                 self.transition_target = None
 
         self.tint_progress = max(0, min(self.tint_progress, 255))
-        self.tint_surf.set_alpha(self.tint_progress)
-        self.display_surface.blit(self.tint_surf, (0,0))
+
+    def draw_tint(self):
+        self.renderer.fade(self.tint_progress)
+
+    def update(self, dt):
+        with PROFILER.timer('transition_check'):
+            self.transition_check()
+        with PROFILER.timer('all_sprites.update'):
+            self.animation_clock.tick(dt)
+            updated = self.all_sprites.update(dt, self.player.rect.center)
+        PROFILER.count('sprites updated', updated)
+        with PROFILER.timer('tint_screen'):
+            self.tint_screen(dt)
+        if self.tint_mode == 'nah' and not self.tint_progress:
+            # prefetched maps are finished while nothing else is going on, so the fade finds them resident
+            with PROFILER.timer('map_prefetch'):
+                self.tmx_maps.poll()
+        self.save_timer += dt
+        if self.save_timer >= SAVE_INTERVAL:
+            with PROFILER.timer('save_world'):
+                self.save_world()
+            self.save_timer = 0
+
+    def advance(self, frame_time):
+        # the simulation only ever moves in SIMULATION_STEP increments, a hitch is capped at MAX_FRAME_TIME
+        # so a long setup can't tunnel the player through thin borders
+        self.accumulator += min(frame_time, MAX_FRAME_TIME)
+        while self.accumulator >= SIMULATION_STEP:
+            self.update(SIMULATION_STEP)
+            self.accumulator -= SIMULATION_STEP
+        # how far the rendered frame sits between the last two simulation steps
+        return self.accumulator / SIMULATION_STEP
+
+    def draw(self, alpha = 1):
+        self.renderer.clear("black")
+        with PROFILER.timer('AllSprites.draw'):
+            self.all_sprites.draw(self.player.render_center(alpha), alpha)
+        with PROFILER.timer('tint_screen'):
+            self.draw_tint()
 
     def run(self):
         while True:
-            dt = self.clock.tick() / 1000
-            self.display_surface.fill("black")
+            # clock.tick sleeps until the frame cap instead of spinning
+            dt = self.clock.tick(FRAME_CAP) / 1000
 
             #event loop
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    pygame.quit()
-                    exit()
+            with PROFILER.timer('events'):
+                for event in pygame.event.get():
+                    # the texture renderer's window only sends WINDOWCLOSE, the hidden display window stays open
+                    if event.type in (pygame.QUIT, pygame.WINDOWCLOSE):
+                        self.save_world(close = True)
+                        pygame.quit()
+                        exit()
+                    if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                        PROFILER.toggle()
 
             #logic
-            self.transition_check()
-            self.all_sprites.update(dt)
-            self.all_sprites.draw(self.player.rect.center)
+            alpha = self.advance(dt)
+            self.draw(alpha)
 
-            self.tint_screen(dt)
-            pygame.display.update()
+            if PROFILER.enabled:
+                self.profiler_overlay.draw()
+            PROFILER.end_frame(dt)
+            self.renderer.present()
 
 if __name__ == '__main__':
         game = Game()
@@ -0,0 +1,314 @@
+from settings import *
+import pickle
+import xml.etree.ElementTree as ET
+from array import array
+from base64 import b64decode
+from os import makedirs, replace, stat, walk
+from os.path import basename, normpath, splitext
+import gzip
+import zlib
+from assets import load_images, decode_images, convert_images
+from pack import packed_map
+
+# compiles Tiled .tmx maps into a compact pickled form (gid arrays, object records, tileset references)
+# and hydrates that form back into objects with the parts of the pytmx api that Game.setup uses
+
+MAP_CACHE_VERSION = 1
+FLIP_X, FLIP_Y, FLIP_DIAGONAL = 0x80000000, 0x40000000, 0x20000000
+GID_MASK = 0x1FFFFFFF
+
+tileset_images = {}
+
+# compiling
+def parse_properties(node):
+    properties = {}
+    props = node.find('properties')
+    if props is None:
+        return properties
+    for prop in props.findall('property'):
+        value = prop.get('value', prop.text or '')
+        kind = prop.get('type', 'string')
+        if kind == 'int':
+            value = int(value)
+        elif kind == 'float':
+            value = float(value)
+        elif kind == 'bool':
+            value = value == 'true'
+        properties[prop.get('name')] = value
+    return properties
+
+def compile_tileset(node, base_dir):
+    tileset = {
+        'tilewidth': int(node.get('tilewidth', 0)),
+        'tileheight': int(node.get('tileheight', 0)),
+        'columns': int(node.get('columns', 0)),
+        'tilecount': int(node.get('tilecount', 0)),
+        'margin': int(node.get('margin', 0)),
+        'spacing': int(node.get('spacing', 0)),
+        'image': None,
+        'tiles': {},
+        'properties': {}}
+    image = node.find('image')
+    if image is not None:
+        tileset['image'] = normpath(join(base_dir, image.get('source')))
+    for tile in node.findall('tile'):
+        tile_id = int(tile.get('id'))
+        tile_image = tile.find('image')
+        if tile_image is not None:
+            tileset['tiles'][tile_id] = normpath(join(base_dir, tile_image.get('source')))
+        properties = parse_properties(tile)
+        if properties:
+            tileset['properties'][tile_id] = properties
+    return tileset
+
+def decode_layer_data(data):
+    encoding = data.get('encoding')
+    if encoding == 'csv':
+        return array('I', (int(gid) for gid in data.text.replace('\n', '').split(',') if gid.strip()))
+    if encoding == 'base64':
+        raw = b64decode(data.text.strip())
+        if data.get('compression') == 'zlib':
+            raw = zlib.decompress(raw)
+        elif data.get('compression') == 'gzip':
+            raw = gzip.decompress(raw)
+        gids = array('I')
+        gids.frombytes(raw)
+        return gids
+    return array('I', (int(tile.get('gid', 0)) for tile in data.findall('tile')))
+
+def compile_map(path):
+    root = ET.parse(path).getroot()
+    map_dir = dirname(path)
+    if root.get('infinite') == '1':
+        raise ValueError(f'{path}: infinite maps are not supported')
+
+    sources = [path]
+    tilesets = []
+    for node in root.findall('tileset'):
+        firstgid = int(node.get('firstgid'))
+        if node.get('source'):
+            tsx_path = normpath(join(map_dir, node.get('source')))
+            sources.append(tsx_path)
+            tilesets.append((firstgid, compile_tileset(ET.parse(tsx_path).getroot(), dirname(tsx_path))))
+        else:
+            tilesets.append((firstgid, compile_tileset(node, map_dir)))
+
+    tile_properties = {}
+    for firstgid, tileset in tilesets:
+        for tile_id, properties in tileset['properties'].items():
+            tile_properties[firstgid + tile_id] = properties
+
+    layers = []
+    for node in root:
+        if node.tag == 'layer':
+            width, height = int(node.get('width')), int(node.get('height'))
+            gids = decode_layer_data(node.find('data'))
+            layers.append(('tiles', node.get('name'), width, height, gids.tobytes()))
+        elif node.tag == 'objectgroup':
+            objects = []
+            for obj in node.findall('object'):
+                gid = int(obj.get('gid', 0))
+                width, height = float(obj.get('width', 0)), float(obj.get('height', 0))
+                x, y = float(obj.get('x', 0)), float(obj.get('y', 0))
+                properties = dict(tile_properties.get(gid & GID_MASK, {}))
+                properties.update(parse_properties(obj))
+                if gid:
+                    # tiled anchors tile objects at their bottom left, pytmx (and setup) expect top left
+                    y -= height
+                objects.append((int(obj.get('id', 0)), obj.get('name'), obj.get('type', obj.get('class')), x, y, width, height, gid, properties))
+            layers.append(('objects', node.get('name'), objects))
+
+    return {
+        'version': MAP_CACHE_VERSION,
+        'sources': [(source, *source_signature(source)) for source in sources],
+        'width': int(root.get('width')),
+        'height': int(root.get('height')),
+        'tilewidth': int(root.get('tilewidth')),
+        'tileheight': int(root.get('tileheight')),
+        'tilesets': tilesets,
+        'layers': layers}
+
+def source_signature(path):
+    info = stat(path)
+    return info.st_mtime_ns, info.st_size
+
+def cache_path(path):
+    return join(MAP_CACHE_DIR, splitext(basename(path))[0] + '.kmap')
+
+def read_cache(path):
+    try:
+        with open(cache_path(path), 'rb') as f:
+            data = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+        return None
+    if data.get('version') != MAP_CACHE_VERSION:
+        return None
+    try:
+        if any(source_signature(source) != (mtime, size) for source, mtime, size in data['sources']):
+            return None
+    except OSError:
+        return None
+    return data
+
+def write_cache(path, data):
+    target = cache_path(path)
+    try:
+        makedirs(MAP_CACHE_DIR, exist_ok = True)
+        with open(target + '.tmp', 'wb') as f:
+            pickle.dump(data, f, pickle.HIGHEST_PROTOCOL)
+        replace(target + '.tmp', target)
+    except OSError as e:
+        print('map cache write error', e)
+
+def compiled_map_data(path):
+    data = read_cache(path)
+    if data is None:
+        data = compile_map(path)
+        write_cache(path, data)
+    return data
+
+# hydrating
+def used_gids(data):
+    gids = set()
+    for layer in data['layers']:
+        if layer[0] == 'tiles':
+            layer_gids = array('I')
+            layer_gids.frombytes(layer[4])
+            gids.update(layer_gids)
+        else:
+            gids.update(obj[7] for obj in layer[2])
+    gids.discard(0)
+    return gids
+
+def tileset_for(tilesets, raw_gid):
+    gid = raw_gid & GID_MASK
+    firstgid, tileset = max(((firstgid, tileset) for firstgid, tileset in tilesets if firstgid <= gid), key = lambda pair: pair[0])
+    return tileset, gid - firstgid
+
+def image_source(tilesets, raw_gid):
+    tileset, local_id = tileset_for(tilesets, raw_gid)
+    return tileset['image'] or tileset['tiles'][local_id]
+
+def prepare_map(path):
+    # the part of loading a map that is safe off the main thread: the compiled data and the raw pixels
+    # of every tileset image it needs that isn't loaded yet. CompiledMap converts those on the main thread
+    # the asset pack carries every map already compiled
+    data = packed_map(path) or compiled_map_data(path)
+    sources = {image_source(data['tilesets'], gid) for gid in used_gids(data)}
+    missing = [source for source in sources if source not in tileset_images]
+    return data, dict(zip(missing, decode_images(missing)))
+
+class MapObject:
+    def __init__(self, id, name, type, x, y, width, height, gid, properties, image):
+        self.id = id
+        self.name = name
+        self.type = type
+        self.x, self.y = x, y
+        self.width, self.height = width, height
+        self.gid = gid
+        self.properties = properties
+        self.image = image
+
+class TileLayer:
+    def __init__(self, name, width, height, gids, images):
+        self.name = name
+        self.width, self.height = width, height
+        self.gids = gids
+        self.images = images
+
+    def tiles(self):
+        width = self.width
+        for index, gid in enumerate(self.gids):
+            if gid:
+                yield index % width, index // width, self.images[gid]
+
+    def __iter__(self):
+        return self.tiles()
+
+class ObjectLayer(list):
+    def __init__(self, name, objects):
+        super().__init__(objects)
+        self.name = name
+
+class CompiledMap:
+    def __init__(self, data, decoded = None):
+        self.width, self.height = data['width'], data['height']
+        self.tilewidth, self.tileheight = data['tilewidth'], data['tileheight']
+        self.tilesets = data['tilesets']
+
+        gids = used_gids(data)
+        # images prepare_map already decoded are only converted, the rest is decoded in one parallel batch
+        load_tileset_images((self.image_source(gid) for gid in gids), decoded or {})
+        self.images = {gid: self.tile_image(gid) for gid in gids}
+
+        self.layers = []
+        self.layernames = {}
+        for layer in data['layers']:
+            if layer[0] == 'tiles':
+                _, name, width, height, raw = layer
+                gids = array('I')
+                gids.frombytes(raw)
+                hydrated = TileLayer(name, width, height, gids, self.images)
+            else:
+                _, name, objects = layer
+                hydrated = ObjectLayer(name, [MapObject(*obj, self.images.get(obj[7])) for obj in objects])
+            self.layers.append(hydrated)
+            # like pytmx, the first layer with a given name wins
+            self.layernames.setdefault(name, hydrated)
+
+    def get_layer_by_name(self, name):
+        try:
+            return self.layernames[name]
+        except KeyError:
+            raise ValueError(f'Layer "{name}" not found')
+
+    def tileset_for(self, raw_gid):
+        return tileset_for(self.tilesets, raw_gid)
+
+    def image_source(self, raw_gid):
+        return image_source(self.tilesets, raw_gid)
+
+    def tile_image(self, raw_gid):
+        tileset, local_id = self.tileset_for(raw_gid)
+        if tileset['image']:
+            sheet = load_tileset_image(tileset['image'])
+            width, height = tileset['tilewidth'], tileset['tileheight']
+            columns = tileset['columns'] or (sheet.get_width() - tileset['margin'] + tileset['spacing']) // (width + tileset['spacing'])
+            col, row = local_id % columns, local_id // columns
+            x = tileset['margin'] + col * (width + tileset['spacing'])
+            y = tileset['margin'] + row * (height + tileset['spacing'])
+            surf = sheet.subsurface((x, y, width, height))
+        else:
+            surf = load_tileset_image(tileset['tiles'][local_id])
+
+        if raw_gid & FLIP_DIAGONAL:
+            surf = pygame.transform.flip(pygame.transform.rotate(surf, 270), True, False)
+        if raw_gid & (FLIP_X | FLIP_Y):
+            surf = pygame.transform.flip(surf, bool(raw_gid & FLIP_X), bool(raw_gid & FLIP_Y))
+        return surf
+
+def load_tileset_images(paths, decoded = None):
+    # tileset images are shared by every map that references them
+    decoded = decoded or {}
+    missing = list({path for path in paths if path not in tileset_images})
+    ready = [path for path in missing if path in decoded]
+    tileset_images.update(zip(ready, convert_images(decoded[path] for path in ready)))
+    missing = [path for path in missing if path not in decoded]
+    tileset_images.update(zip(missing, load_images(missing)))
+
+def load_tileset_image(path):
+    if path not in tileset_images:
+        load_tileset_images([path])
+    return tileset_images[path]
+
+def load_map(path):
+    return CompiledMap(*prepare_map(path))
+
+if __name__ == '__main__':
+    # compile step: refresh the cache for every map in data/maps
+    for folder_path, sub_folders, file_names in walk(join('..', 'data', 'maps')):
+        for file in file_names:
+            if file.endswith('.tmx'):
+                path = join(folder_path, file)
+                write_cache(path, compile_map(path))
+                print('compiled', path, '->', cache_path(path))
@@ -0,0 +1,70 @@
+from settings import *
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pack import listdir
+from os.path import splitext
+from mapcache import prepare_map, CompiledMap
+
+class MapLoader:
+    def __init__(self, *path, capacity = RESIDENT_MAPS, prebuild = None):
+        folder = join(*path)
+        self.paths = {splitext(file)[0]: join(folder, file) for file in listdir(folder) if file.endswith('.tmx')}
+        self.capacity = capacity
+        self.prebuild = prebuild
+
+        # maps are loaded on first use and kept in a small lru, the active map is never evicted.
+        # the prefetch thread only reads the compiled data and decodes pixels, converting them to the display
+        # format and prebuild (laying out terrain chunks) happen on the main thread, which owns all the state here:
+        # in poll() on an idle frame once the prefetch is done, or in get() if the map is needed before that
+        self.resident = OrderedDict()
+        self.pending = {}
+        self.active = None
+        self.executor = ThreadPoolExecutor(max_workers = 1, thread_name_prefix = 'map-prefetch')
+
+    def get(self, name):
+        self.active = name
+        if name in self.resident:
+            self.resident.move_to_end(name)
+            return self.resident[name]
+        future = self.pending.pop(name, None)
+        return self.finish(name, future.result() if future else prepare_map(self.paths[name]))
+
+    def prefetch(self, names):
+        # only the maps reachable from the current one stay queued
+        names = [name for name in names if name in self.paths and name not in self.resident]
+        for name in list(self.pending):
+            if name not in names:
+                self.pending.pop(name).cancel()
+        for name in names:
+            if name not in self.pending:
+                self.pending[name] = self.executor.submit(prepare_map, self.paths[name])
+
+    def poll(self):
+        # finishes at most one prefetched map per call
+        for name, future in self.pending.items():
+            if future.done():
+                del self.pending[name]
+                self.finish(name, future.result())
+                return name
+        return None
+
+    def finish(self, name, prepared):
+        tmx_map = CompiledMap(*prepared)
+        if self.prebuild:
+            self.prebuild(tmx_map)
+        self.resident[name] = tmx_map
+        self.resident.move_to_end(name)
+        for old_name in list(self.resident):
+            if len(self.resident) <= self.capacity:
+                break
+            if old_name != self.active:
+                del self.resident[old_name]
+        return tmx_map
+
+    def release(self, name):
+        self.resident.pop(name, None)
+        if name in self.pending:
+            self.pending.pop(name).cancel()
+
+    def __contains__(self, name):
+        return name in self.resident
@@ -1,4 +1,8 @@
 from settings import *
+from text import TEXT
+from time import time
+from savegame import SaveFile
+from pack import open_asset
 # To be converted into something built in to kaugame
 
 # Simple pet UI for the game: naming, species, care actions, reactions, expense tracking
@@ -9,10 +13,16 @@ def hex_to_rgb(h):
     h = h.lstrip('#')
     return tuple(int(h[i:i+2],16) for i in (0,2,4))
 
+def draw_border(surf, color, rect, width=2):
+    # same as pygame.draw.rect(surf, color, rect, width), which draws the wrong rows while a clip is set
+    x, y, w, h = rect
+    for strip in ((x,y,w,width), (x,y+h-width,w,width), (x,y,width,h), (x+w-width,y,width,h)):
+        surf.fill(color, strip)
+
 def load_game_font(name, size):
     try:
         path = join(dirname(__file__), '..', 'graphics', 'fonts', name)
-        return pygame.font.Font(path, size)
+        return pygame.font.Font(open_asset(path), size)
     except Exception:
         return pygame.font.SysFont(None, size)
 
@@ -99,6 +109,42 @@ class Pet:
             if self.happiness > 60 and self.cleanliness > 50:
                 self.health = min(100, self.health + 0.2 * seconds)
 
+    def catch_up(self, seconds):
+        # closed form of pass_time for long absences: every rate is constant until some stat crosses
+        # one of the thresholds pass_time branches on, so jump straight from one crossing to the next
+        while seconds > 0:
+            # conditions as they hold just after this instant (hunger and cleanliness only ever go down)
+            happiness_rate = (-0.4 if self.hunger <= 25 else 0) + (-0.3 if self.cleanliness <= 25 else 0)
+            if self.hunger <= 15 or self.cleanliness <= 10:
+                health_rate = -0.6
+            elif self.happiness > 60 and self.cleanliness > 50:
+                health_rate = 0.2
+            else:
+                health_rate = 0
+
+            stats = (
+                ('hunger', -0.6, (25,15,0)),
+                ('cleanliness', -0.08, (50,25,10,0)),
+                ('energy', 0.5, (100,)),
+                ('happiness', happiness_rate, (60,0)),
+                ('health', health_rate, (100,0)))
+            step, crossing = seconds, None
+            for attr, rate, thresholds in stats:
+                value = getattr(self, attr)
+                ahead = [t for t in thresholds if (t < value if rate < 0 else t > value)] if rate else []
+                if ahead:
+                    target = max(ahead) if rate < 0 else min(ahead)
+                    duration = (target - value) / rate
+                    if duration <= step:
+                        step, crossing = duration, (attr, target)
+
+            for attr, rate, thresholds in stats:
+                setattr(self, attr, max(0, min(100, getattr(self, attr) + rate * step)))
+            if crossing:
+                # land exactly on the threshold so the next segment sees the right branch
+                setattr(self, *crossing)
+            seconds -= step
+
     def reaction(self):
         # map stats to reaction string corresponding to animal image names
         if self.health < 30:
@@ -129,9 +175,92 @@ class Pet:
         p.expenses_total = d.get('expenses_total',0)
         return p
 
-class Button:
-    def __init__(self, rect, text, cb, bg=GRAY, fg=BLACK):
+# Retained-mode widgets: each one remembers the state it last drew and reports the screen areas
+# it invalidated, so PetUI only repaints (and pushes to the display) what actually changed
+class Widget:
+    def __init__(self, rect):
         self.rect = pygame.Rect(rect)
+        self.state = None
+        self.dirty = True
+
+    def get_state(self):
+        return None
+
+    def update_rect(self):
+        pass
+
+    def refresh(self):
+        state = self.get_state()
+        if not self.dirty and state == self.state:
+            return []
+        old_rect = self.rect.copy()
+        self.state = state
+        self.dirty = False
+        self.update_rect()
+        return [old_rect, self.rect.copy()] if old_rect != self.rect else [old_rect]
+
+    def draw(self, surf):
+        pass
+
+class Panel(Widget):
+    def __init__(self, rect, color=WHITE, border=ACCENT):
+        super().__init__(rect)
+        self.color = color
+        self.border = border
+
+    def draw(self, surf):
+        pygame.draw.rect(surf, self.color, self.rect)
+        if self.border:
+            draw_border(surf, self.border, self.rect)
+
+class Label(Widget):
+    def __init__(self, pos, text, font=None):
+        super().__init__((pos, (0,0)))
+        self.pos = pos
+        self.text = text
+        self.font = font or FONT
+
+    def get_state(self):
+        return self.text() if callable(self.text) else self.text
+
+    def update_rect(self):
+        # live text (stats, money) changes often, so compose it from glyphs instead of rasterizing it
+        render = TEXT.render_glyphs if callable(self.text) else TEXT.render
+        self.surf = render(self.font, self.state, BLACK)
+        self.rect = self.surf.get_rect(topleft=self.pos)
+
+    def draw(self, surf):
+        surf.blit(self.surf, self.rect)
+
+class Bar(Widget):
+    def __init__(self, rect, value, color):
+        super().__init__(rect)
+        self.value = value
+        self.color = color
+
+    def get_state(self):
+        return int(self.value()/100*self.rect.width)
+
+    def draw(self, surf):
+        pygame.draw.rect(surf, GRAY, self.rect)
+        pygame.draw.rect(surf, self.color, (self.rect.x, self.rect.y, self.state, self.rect.height))
+
+class Canvas(Widget):
+    # widget painted by a callback, repainted whenever state() changes
+    def __init__(self, rect, state, paint):
+        super().__init__(rect)
+        self.state_fn = state
+        self.paint = paint
+
+    def get_state(self):
+        return self.state_fn()
+
+    def draw(self, surf):
+        self.paint()
+
+class Button(Widget):
+    def __init__(self, rect, text, cb, bg=GRAY, fg=BLACK):
+        super().__init__(rect)
         self.text = text
         self.callback = cb
         self.bg = bg
@@ -139,8 +268,8 @@ class Button:
 
     def draw(self, surf):
         pygame.draw.rect(surf, self.bg, self.rect)
-        pygame.draw.rect(surf, ACCENT, self.rect, 2)
-        txt = FONT.render(self.text, False, self.fg)
+        draw_border(surf, ACCENT, self.rect)
+        txt = TEXT.render(FONT, self.text, self.fg)
         surf.blit(txt, (self.rect.x+8, self.rect.y + (self.rect.height - txt.get_height())//2))
 
     def handle_event(self, event):
@@ -168,21 +297,13 @@ class PetUI:
         self.health_btn = Button((120,40,160,36),'Health ($10)', self.health_check)
         self.species_btn = Button((500,320,160,36),'Next Species', self.next_species)
 
-        # load animal images
-        base = join(dirname(__file__), '..', 'animal_pics', 'animal picutes')
-        self.animal_images = {}
-        for sp in ('cat','dog'):
-            self.animal_images[sp] = {}
-            for emo in ('anger','fear','joy','love','sadness'):
-                try:
-                    img = pygame.image.load(join(base, f"{sp}_{emo}.png")).convert_alpha()
-                    self.animal_images[sp][emo] = img
-                except Exception:
-                    self.animal_images[sp][emo] = None
-        try:
-            self.animal_images['fish'] = pygame.image.load(join(base,'fish.png')).convert_alpha()
-        except Exception:
-            self.animal_images['fish'] = None
+        # reaction images are decoded and scaled on first use, only the scaled copy is kept
+        self.image_dir = join(dirname(__file__), '..', 'animal_pics', 'animal picutes')
+        self.pet_images = {}
+
+        self.save_file = SaveFile(SAVE_PATH)
+
+        self.build_widgets()
 
     def feed(self):
         if not self.pet.feed():
@@ -207,22 +328,30 @@ class PetUI:
         idx = self.SPECIES.index(self.pet.species) if self.pet.species in self.SPECIES else 0
         self.pet.species = self.SPECIES[(idx+1)%len(self.SPECIES)]
 
+    def pet_image(self, species, emotion):
+        key = (species, emotion)
+        if key not in self.pet_images:
+            if species == 'fish':
+                file, size = 'fish.png', (160,120)
+            else:
+                file, size = f"{species}_{emotion}.png", (200,200)
+            try:
+                img = pygame.image.load(open_asset(join(self.image_dir, file)), file).convert_alpha()
+                self.pet_images[key] = pygame.transform.scale(img, size)
+            except Exception:
+                self.pet_images[key] = None
+        return self.pet_images[key]
+
     def draw_pet(self):
         center = (200,180)
-        pet_rect = pygame.Rect(center[0]-100, center[1]-100, 200, 200)
         drew = False
-        if self.pet.species in ('cat','dog') and self.animal_images.get(self.pet.species):
-            emo = self.pet.reaction()
-            img = self.animal_images[self.pet.species].get(emo)
+        if self.pet.species in ('cat','dog','fish'):
+            # the fish has a single picture whatever its mood
+            emotion = self.pet.reaction() if self.pet.species != 'fish' else None
+            img = self.pet_image(self.pet.species, emotion)
             if img:
-                scaled = pygame.transform.scale(img, (200,200))
-                self.screen.blit(scaled, scaled.get_rect(center=center).topleft)
+                self.screen.blit(img, img.get_rect(center=center).topleft)
                 drew = True
-        elif self.pet.species == 'fish' and self.animal_images.get('fish'):
-            img = self.animal_images['fish']
-            scaled = pygame.transform.scale(img, (160,120))
-            self.screen.blit(scaled, scaled.get_rect(center=center).topleft)
-            drew = True
 
         if not drew:
             pygame.draw.ellipse(self.screen, (30,30,30), (center[0]-60, center[1]+50, 120, 20))
@@ -231,40 +360,41 @@ class PetUI:
             pygame.draw.rect(self.screen, BLACK, (center[0]+24, center[1]-26, 12,12))
             pygame.draw.rect(self.screen, BLACK, (center[0]-16, center[1]+18, 32,6))
 
-    def draw_stats(self):
-        panel = pygame.Rect(360,40,310,260)
-        pygame.draw.rect(self.screen, WHITE, panel)
-        pygame.draw.rect(self.screen, ACCENT, panel, 2)
-        self.screen.blit(TITLE_FONT.render('Pet Info', False, BLACK), (370,48))
-
-        def bar(y, name, val):
-            self.screen.blit(FONT.render(f"{name}: {int(val)}", False, BLACK), (380,y))
-            pygame.draw.rect(self.screen, GRAY, (380,y+22,220,18))
+    def build_widgets(self):
+        # back to front, the same order the screen used to be painted in every frame
+        pet = lambda: self.pet
+        self.widgets = [
+            Panel((20,20,320,320)),
+            Canvas((100,80,200,200), lambda: (pet().species, pet().reaction()), self.draw_pet),
+            Panel((360,40,310,260)),
+            Label((370,48), 'Pet Info', TITLE_FONT)]
+        for y, name, attr in ((90,'Hunger','hunger'), (130,'Happiness','happiness'), (170,'Energy','energy'), (210,'Cleanliness','cleanliness')):
+            value = lambda attr=attr: getattr(pet(), attr)
             color = (200,100,50) if name in ('Hunger','Health') else (0,200,0)
-            pygame.draw.rect(self.screen, color, (380,y+22,int(val/100*220),18))
-
-        bar(90,'Hunger', self.pet.hunger)
-        bar(130,'Happiness', self.pet.happiness)
-        bar(170,'Energy', self.pet.energy)
-        bar(210,'Cleanliness', self.pet.cleanliness)
-        self.screen.blit(FONT.render(f"Health: {int(self.pet.health)}", False, BLACK), (380,250))
-        self.screen.blit(FONT.render(f"Money: ${int(self.pet.money)}", False, BLACK), (380,274))
-        self.screen.blit(FONT.render(f"Expenses: ${int(self.pet.expenses_total)}", False, BLACK), (380,296))
-
-        # name field
-        pygame.draw.rect(self.screen, (240,240,240), (380,320,220,34))
-        self.screen.blit(FONT.render('Name:', False, BLACK), (388,326))
-        name_txt = self.name_buffer + ('|' if self.input_active and (pygame.time.get_ticks()//400)%2==0 else '')
-        self.screen.blit(FONT.render(name_txt, False, BLACK), (438,326))
-
-        # species
-        self.screen.blit(FONT.render(f"Species: {self.pet.species}", False, BLACK), (380,350))
-        self.screen.blit(FONT.render('Move: none   Interact: click buttons', False, BLACK), (380,370))
+            self.widgets.append(Label((380,y), lambda name=name, value=value: f"{name}: {int(value())}"))
+            self.widgets.append(Bar((380,y+22,220,18), value, color))
+        self.widgets += [
+            Label((380,250), lambda: f"Health: {int(pet().health)}"),
+            Label((380,274), lambda: f"Money: ${int(pet().money)}"),
+            Label((380,296), lambda: f"Expenses: ${int(pet().expenses_total)}"),
+            # name field
+            Panel((380,320,220,34), (240,240,240), None),
+            Label((388,326), 'Name:'),
+            Label((438,326), lambda: self.name_buffer + ('|' if self.input_active and (pygame.time.get_ticks()//400)%2==0 else '')),
+            # species
+            Label((380,350), lambda: f"Species: {pet().species}"),
+            Label((380,370), 'Move: none   Interact: click buttons'),
+            self.feed_btn, self.play_btn, self.rest_btn, self.clean_btn, self.health_btn, self.species_btn,
+            Label((20,320-40), lambda: pet().name, TITLE_FONT)]
+        self.full_redraw = True
 
     def handle_event(self, event):
         for btn in (self.feed_btn, self.play_btn, self.rest_btn, self.clean_btn, self.health_btn, self.species_btn):
             btn.handle_event(event)
 
+        if event.type in (pygame.WINDOWEXPOSED, pygame.VIDEOEXPOSE):
+            self.full_redraw = True
+
         if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
             if pygame.Rect(380,320,220,34).collidepoint(event.pos):
                 self.input_active = True
@@ -282,37 +412,48 @@ class PetUI:
                     self.name_buffer += event.unicode
 
     def draw(self):
-        self.screen.fill(BG)
-        left_panel = pygame.Rect(20,20,320,320)
-        pygame.draw.rect(self.screen, WHITE, left_panel)
-        pygame.draw.rect(self.screen, ACCENT, left_panel, 2)
-        self.draw_pet()
-        self.draw_stats()
-        for btn in (self.feed_btn, self.play_btn, self.rest_btn, self.clean_btn, self.health_btn, self.species_btn):
-            btn.draw(self.screen)
-        self.screen.blit(TITLE_FONT.render(self.pet.name, False, BLACK), (20,320-40))
-        pygame.display.flip()
+        # repaint only the regions whose widgets changed, back to front, and push just those rects
+        dirty = []
+        for widget in self.widgets:
+            dirty += widget.refresh()
+        if self.full_redraw:
+            dirty = [self.screen.get_rect()]
+            self.full_redraw = False
+        if not dirty:
+            return
+
+        for rect in dirty:
+            self.screen.set_clip(rect)
+            self.screen.fill(BG)
+            for widget in self.widgets:
+                if widget.rect.colliderect(rect):
+                    widget.draw(self.screen)
+        self.screen.set_clip(None)
+        pygame.display.update(dirty)
 
     def save(self):
+        # called every SAVE_INTERVAL while running, only the stats that changed are journaled
         try:
-            with open(SAVE_PATH,'w',encoding='utf-8') as f:
-                json.dump(self.pet.to_dict(), f, indent=2)
+            # the save time lets the next launch catch the pet up on the time spent away
+            self.save_file.record(self.pet.to_dict() | {'saved_at': time()})
         except Exception as e:
             print('save error', e)
 
     def load(self):
-        if exists(SAVE_PATH):
-            try:
-                with open(SAVE_PATH,'r',encoding='utf-8') as f:
-                    data = json.load(f)
-                    self.pet = Pet.from_dict(data)
-                    self.name_buffer = self.pet.name
-            except Exception as e:
-                print('load error', e)
+        try:
+            data = self.save_file.load()
+            if data:
+                self.pet = Pet.from_dict(data)
+                if 'saved_at' in data:
+                    self.pet.catch_up(max(0, time() - data['saved_at']))
+                self.name_buffer = self.pet.name
+        except Exception as e:
+            print('load error', e)
 
     def run(self):
         running = True
         self.load()
+        save_timer = 0
         while running:
             dt = self.clock.tick(60) / 1000
             self.pet.pass_time(dt)
@@ -322,7 +463,15 @@ class PetUI:
                 else:
                     self.handle_event(event)
             self.draw()
+            save_timer += dt
+            if save_timer >= SAVE_INTERVAL:
+                self.save()
+                save_timer = 0
         self.save()
+        try:
+            self.save_file.close()
+        except Exception as e:
+            print('save error', e)
 
 
 def main():
@@ -0,0 +1,207 @@
+from settings import *
+import mmap
+import pickle
+import struct
+import zlib
+from io import RawIOBase, SEEK_SET, SEEK_CUR, SEEK_END
+from os import chdir, replace, sep, stat, walk as os_walk, listdir as os_listdir
+from os.path import abspath, relpath
+
+# single file asset pack: every file under the packed folders (graphics, maps, tilesets, pet photos) is
+# appended to ASSET_PACK_PATH together with the compiled form of each .tmx map, the folder listings and the
+# mtime and size of every source. a png is stored as the same rgba pixels the image cache holds, zlib
+# compressed, whenever that comes out smaller than the png (pixel art always does, and inflating it is
+# cheaper than png decoding), otherwise as the png itself.
+# at runtime the pack is memory mapped once and walk/listdir, images, fonts and map loading are served from
+# slices of the mapping without opening or stat'ing the original files again. with ASSET_PACK_CHECK on (asset
+# work) a pack whose sources changed since it was built is ignored with a warning, and everything falls back
+# to the loose files and their caches
+# usage (from code/): python pack.py
+
+PACK_VERSION = 3
+HEADER = struct.Struct('<4sIQQ')
+ROOT = abspath(join(dirname(__file__), '..'))
+PACK_FOLDERS = [join('..', 'graphics'), join('..', 'data', 'maps'), join('..', 'data', 'tilesets'), join('..', 'animal_pics')]
+
+def pack_key(path):
+    # the same file reached through '..' from code/ or through an absolute path gets the same key
+    return relpath(abspath(path), ROOT).replace(sep, '/')
+
+class PackFile(RawIOBase):
+    # read only file object over one entry of the mapped pack, for pygame.image.load and pygame.font.Font
+    def __init__(self, view, name):
+        self.view = view
+        self.name = name
+        self.pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def read(self, size = -1):
+        end = len(self.view) if size is None or size < 0 else min(len(self.view), self.pos + size)
+        data = self.view[self.pos:end].tobytes()
+        self.pos = max(self.pos, end)
+        return data
+
+    def readinto(self, buffer):
+        data = self.view[self.pos:self.pos + len(buffer)]
+        buffer[:len(data)] = data
+        self.pos += len(data)
+        return len(data)
+
+    def seek(self, offset, whence = SEEK_SET):
+        if whence == SEEK_CUR:
+            offset += self.pos
+        elif whence == SEEK_END:
+            offset += len(self.view)
+        self.pos = max(0, offset)
+        return self.pos
+
+    def tell(self):
+        return self.pos
+
+class AssetPack:
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.mapping = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+        self.view = memoryview(self.mapping)
+        magic, version, offset, size = HEADER.unpack_from(self.view)
+        if (magic, version) != (b'KPAK', PACK_VERSION):
+            raise ValueError(f'{path}: not a version {PACK_VERSION} asset pack')
+        index = pickle.loads(self.view[offset:offset + size])
+        self.files, self.images, self.maps, self.dirs = index['files'], index['images'], index['maps'], index['dirs']
+        self.sources = index['sources']
+
+    def stale(self):
+        # a changed, added or removed file changes its own signature or the one of its folder
+        for key, signature in self.sources.items():
+            try:
+                if source_signature(join(ROOT, key)) != signature:
+                    return key
+            except OSError:
+                return key
+        return None
+
+    def entry(self, table, path):
+        offset, size = table[pack_key(path)]
+        return self.view[offset:offset + size]
+
+    def __contains__(self, path):
+        return pack_key(path) in self.files
+
+    def open(self, path):
+        return PackFile(self.entry(self.files, path), path)
+
+    def pixels(self, path):
+        # (size, rgba pixels) inflated straight out of the mapping, safe on the decode threads
+        offset, size, width, height = self.images[pack_key(path)]
+        return (width, height), zlib.decompress(self.view[offset:offset + size])
+
+    def map_data(self, path):
+        return pickle.loads(self.entry(self.maps, path)) if pack_key(path) in self.maps else None
+
+    def walk(self, top):
+        # same top down order and folder_path joining as os.walk
+        sub_folders, file_names = self.dirs[pack_key(top)]
+        sub_folders = list(sub_folders)
+        yield top, sub_folders, list(file_names)
+        for sub_folder in sub_folders:
+            yield from self.walk(join(top, sub_folder))
+
+    def listdir(self, folder):
+        sub_folders, file_names = self.dirs[pack_key(folder)]
+        return sub_folders + file_names
+
+def source_signature(path):
+    info = stat(path)
+    return info.st_mtime_ns, info.st_size
+
+def open_pack(path = ASSET_PACK_PATH, check = ASSET_PACK_CHECK):
+    if not exists(path):
+        return None
+    try:
+        pack = AssetPack(path)
+    except (OSError, ValueError, KeyError, struct.error, pickle.UnpicklingError) as e:
+        print('asset pack error', e)
+        return None
+    stale = check and pack.stale()
+    if stale:
+        print(f'asset pack is stale ({stale} changed), loading loose files; rebuild it with python pack.py')
+        return None
+    return pack
+
+PACK = open_pack()
+
+# drop in replacements for the loaders, served from the pack when it has the path
+def packed(path):
+    return PACK is not None and path in PACK
+
+def packed_pixels(path):
+    return PACK.pixels(path) if PACK is not None and pack_key(path) in PACK.images else None
+
+def open_asset(path):
+    # a file object for pygame loaders, or the path itself when it isn't packed
+    return PACK.open(path) if packed(path) else path
+
+def packed_map(path):
+    return PACK.map_data(path) if PACK is not None else None
+
+def walk(top):
+    if PACK is not None and pack_key(top) in PACK.dirs:
+        return PACK.walk(top)
+    return os_walk(top)
+
+def listdir(folder):
+    if PACK is not None and pack_key(folder) in PACK.dirs:
+        return PACK.listdir(folder)
+    return os_listdir(folder)
+
+# build step
+def build(target = ASSET_PACK_PATH, folders = PACK_FOLDERS):
+    # the map compiler imports the image loaders, which import this module
+    from mapcache import compile_map
+    files, images, maps, dirs, sources = {}, {}, {}, {}, {}
+    with open(target + '.tmp', 'wb') as f:
+        f.write(HEADER.pack(b'KPAK', PACK_VERSION, 0, 0))
+
+        def append(table, key, data):
+            table[key] = (f.tell(), len(data))
+            f.write(data)
+
+        for folder in folders:
+            for folder_path, sub_folders, file_names in os_walk(folder):
+                dirs[pack_key(folder_path)] = (list(sub_folders), list(file_names))
+                sources[pack_key(folder_path)] = source_signature(folder_path)
+                for file in file_names:
+                    path = join(folder_path, file)
+                    sources[pack_key(path)] = source_signature(path)
+                    with open(path, 'rb') as source:
+                        data = source.read()
+                    if file.endswith('.png'):
+                        # decoded exactly like assets.decode does before it caches the pixels
+                        surf = pygame.image.load(path)
+                        pixels = zlib.compress(pygame.image.tobytes(surf, 'RGBA'), 9)
+                        if len(pixels) < len(data):
+                            append(images, pack_key(path), pixels)
+                            images[pack_key(path)] += surf.get_size()
+                            continue
+                    append(files, pack_key(path), data)
+                    if file.endswith('.tmx'):
+                        append(maps, pack_key(path), pickle.dumps(compile_map(path), pickle.HIGHEST_PROTOCOL))
+
+        index = pickle.dumps({'files': files, 'images': images, 'maps': maps, 'dirs': dirs, 'sources': sources}, pickle.HIGHEST_PROTOCOL)
+        offset = f.tell()
+        f.write(index)
+        f.seek(0)
+        f.write(HEADER.pack(b'KPAK', PACK_VERSION, offset, len(index)))
+    replace(target + '.tmp', target)
+    return len(files) + len(images), len(maps)
+
+if __name__ == '__main__':
+    # every path in the pack (and in the compiled maps) is relative to code/
+    chdir(dirname(abspath(__file__)))
+    file_count, map_count = build()
+    print('packed', file_count, 'files and', map_count, 'maps into', ASSET_PACK_PATH)
@@ -0,0 +1,178 @@
+from settings import *
+import numpy as np
+from min_pet_ui import Pet
+
+# struct of arrays storage for many pets (owned pets, shelter npcs, leaderboard ticks)
+# every stat lives in one numpy array so pass_time, reactions and care actions run as batched array ops,
+# store[i] hands back a PetView that behaves like a Pet (to_dict, feed, reaction ...) backed by the arrays
+
+STATS = ('hunger', 'happiness', 'energy', 'cleanliness', 'health')
+FUNDS = ('money', 'expenses_total')
+REACTIONS = np.array(['fear', 'anger', 'love', 'joy', 'sadness'])
+
+class PetStore:
+    def __init__(self, capacity = 64):
+        self.count = 0
+        self.names, self.species = [], []
+        self.arrays = {name: np.zeros(capacity) for name in STATS}
+        self.arrays |= {name: np.zeros(capacity, dtype = np.int64) for name in FUNDS}
+
+    @classmethod
+    def from_pets(cls, pets):
+        store = cls(max(64, len(pets)))
+        for pet in pets:
+            store.add(pet)
+        return store
+
+    @classmethod
+    def from_dicts(cls, dicts):
+        return cls.from_pets([Pet.from_dict(d) for d in dicts])
+
+    def to_dicts(self):
+        return [self[index].to_dict() for index in range(self.count)]
+
+    def add(self, pet):
+        capacity = len(self.arrays['hunger'])
+        if self.count == capacity:
+            for name, array in self.arrays.items():
+                self.arrays[name] = np.concatenate((array, np.zeros_like(array)))
+        index = self.count
+        self.names.append(pet.name)
+        self.species.append(pet.species)
+        self.count += 1
+        self.write(index, pet)
+        return index
+
+    def set(self, index, d):
+        # overwrite one pet with a saved dict, same defaults as Pet.from_dict
+        pet = Pet.from_dict(d)
+        index = self[index].index
+        self.names[index], self.species[index] = pet.name, pet.species
+        self.write(index, pet)
+
+    def write(self, index, pet):
+        for name in STATS + FUNDS:
+            self.arrays[name][index] = getattr(pet, name)
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if not -self.count <= index < self.count:
+            raise IndexError('pet index out of range')
+        return PetView(self, index % self.count)
+
+    def select(self, pets = None):
+        # pets: None for every pet, a boolean mask or an array of indices
+        if pets is None:
+            return np.ones(self.count, dtype = bool)
+        pets = np.asarray(pets)
+        if pets.dtype == bool:
+            return pets
+        mask = np.zeros(self.count, dtype = bool)
+        mask[pets] = True
+        return mask
+
+    def spend(self, amount, pets = None):
+        paid = self.select(pets) & (self.money >= amount)
+        self.money[paid] -= amount
+        self.expenses_total[paid] += amount
+        return paid
+
+    # care actions, same rules as the Pet methods, returning a mask of the pets they succeeded for
+    def feed(self, pets = None, cost = 5):
+        fed = self.spend(cost, pets) & (self.hunger < 100)
+        self.hunger[fed] = np.minimum(100, self.hunger[fed] + 20)
+        self.happiness[fed] = np.minimum(100, self.happiness[fed] + 6)
+        return fed
+
+    def play(self, pets = None):
+        played = self.select(pets) & (self.energy >= 12) & (self.hunger >= 8)
+        self.energy[played] = np.maximum(0, self.energy[played] - 12)
+        self.hunger[played] = np.maximum(0, self.hunger[played] - 8)
+        self.happiness[played] = np.minimum(100, self.happiness[played] + 12)
+        return played
+
+    def rest(self, pets = None):
+        rested = self.select(pets)
+        self.energy[rested] = np.minimum(100, self.energy[rested] + 28)
+        self.hunger[rested] = np.maximum(0, self.hunger[rested] - 6)
+        self.happiness[rested] = np.minimum(100, self.happiness[rested] + 4)
+        return rested
+
+    def clean(self, pets = None, cost = 3):
+        cleaned = self.spend(cost, pets)
+        self.cleanliness[cleaned] = np.minimum(100, self.cleanliness[cleaned] + 40)
+        self.happiness[cleaned] = np.minimum(100, self.happiness[cleaned] + 4)
+        self.health[cleaned] = np.minimum(100, self.health[cleaned] + 3)
+        return cleaned
+
+    def health_check(self, pets = None, cost = 10):
+        checked = self.spend(cost, pets)
+        self.health[checked] = np.minimum(100, self.health[checked] + 22)
+        self.happiness[checked] = np.minimum(100, self.happiness[checked] + 6)
+        return checked
+
+    def pass_time(self, seconds):
+        hunger, happiness, energy, cleanliness, health = (getattr(self, name) for name in STATS)
+        np.maximum(0, hunger - 0.6 * seconds, out = hunger)
+        np.maximum(0, cleanliness - 0.08 * seconds, out = cleanliness)
+        np.clip(energy + 0.5 * seconds, 0, 100, out = energy)
+
+        # the threshold rules of Pet.pass_time as masks, applied in the same order
+        hungry = hunger < 25
+        happiness[hungry] = np.maximum(0, happiness[hungry] - 0.4 * seconds)
+        dirty = cleanliness < 25
+        happiness[dirty] = np.maximum(0, happiness[dirty] - 0.3 * seconds)
+        sick = (hunger < 15) | (cleanliness < 10)
+        health[sick] = np.maximum(0, health[sick] - 0.6 * seconds)
+        thriving = ~sick & (happiness > 60) & (cleanliness > 50)
+        health[thriving] = np.minimum(100, health[thriving] + 0.2 * seconds)
+
+    def reactions(self):
+        conditions = [
+            self.health < 30,
+            self.hunger < 20,
+            (self.happiness >= 85) & (self.energy >= 60),
+            self.happiness >= 65,
+            self.happiness < 35]
+        return np.select(conditions, REACTIONS, 'joy')
+
+class PetView(Pet):
+    # a single pet inside a PetStore, every Pet method works on it through the properties below
+    def __init__(self, store, index):
+        self.store = store
+        self.index = index
+
+    @classmethod
+    def from_dict(cls, d, store = None):
+        # a view needs a slot to live in: the pet is added to store, or to a fresh one pet store
+        store = store if store is not None else PetStore(1)
+        return store[store.add(Pet.from_dict(d))]
+
+def column_property(name):
+    # live view of the filled part of a stat array, e.g. store.hunger
+    return property(lambda self: self.arrays[name][:self.count])
+
+def stat_property(name, cast):
+    def get(self):
+        return cast(self.store.arrays[name][self.index])
+    def set(self, value):
+        self.store.arrays[name][self.index] = value
+    return property(get, set)
+
+def list_property(name):
+    def get(self):
+        return getattr(self.store, name)[self.index]
+    def set(self, value):
+        getattr(self.store, name)[self.index] = value
+    return property(get, set)
+
+for name in STATS + FUNDS:
+    setattr(PetStore, name, column_property(name))
+for name in STATS:
+    setattr(PetView, name, stat_property(name, float))
+for name in FUNDS:
+    setattr(PetView, name, stat_property(name, int))
+PetView.name = list_property('names')
+PetView.species = list_property('species')
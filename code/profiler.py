@@ -0,0 +1,96 @@
+from settings import *
+from collections import deque
+from time import perf_counter
+from text import TEXT
+from pack import open_asset
+
+# lightweight instrumentation: named timers and counters collected per frame
+#   with PROFILER.timer('name'): ...
+#   PROFILER.count('name', amount)
+# while disabled, timer() hands back a shared no-op context manager and count() returns immediately
+
+class NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+NULL_TIMER = NullTimer()
+
+class Timer:
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.profiler.add_time(self.name, perf_counter() - self.start)
+        return False
+
+class Profiler:
+    def __init__(self, history = PROFILER_HISTORY):
+        self.enabled = False
+        self.frame_times = deque(maxlen = history)
+        self.timers, self.counters = {}, {}
+        self.last_timers, self.last_counters = {}, {}
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        self.frame_times.clear()
+        self.timers, self.counters = {}, {}
+
+    def timer(self, name):
+        return Timer(self, name) if self.enabled else NULL_TIMER
+
+    def add_time(self, name, seconds):
+        self.timers[name] = self.timers.get(name, 0) + seconds
+
+    def count(self, name, amount = 1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def end_frame(self, frame_time):
+        if self.enabled:
+            self.frame_times.append(frame_time)
+            self.last_timers, self.timers = self.timers, {}
+            self.last_counters, self.counters = self.counters, {}
+
+PROFILER = Profiler()
+
+class ProfilerOverlay:
+    def __init__(self, renderer, profiler = PROFILER):
+        self.profiler = profiler
+        self.renderer = renderer
+        self.font = pygame.font.Font(open_asset(join('..', 'graphics', 'fonts', 'PixeloidSans.ttf')), 14)
+        self.graph_rect = pygame.Rect(10, 10, PROFILER_HISTORY * 2, 60)
+        self.panel = pygame.Surface((self.graph_rect.width + 20, 280), pygame.SRCALPHA)
+
+    def draw(self):
+        profiler = self.profiler
+        self.panel.fill((0, 0, 0, 170))
+
+        # frame time graph at 2px per ms, the line marks 60 fps
+        graph = self.graph_rect
+        target = graph.bottom - 2000 / 60
+        pygame.draw.line(self.panel, COLORS['gold'], (graph.left, target), (graph.right, target))
+        for index, frame_time in enumerate(profiler.frame_times):
+            height = min(graph.height, frame_time * 2000)
+            color = COLORS['plant'] if frame_time <= 1 / 60 else COLORS['red']
+            pygame.draw.line(self.panel, color, (graph.left + index * 2, graph.bottom), (graph.left + index * 2, graph.bottom - height))
+
+        frame_times = profiler.frame_times
+        average = sum(frame_times) / len(frame_times) if frame_times else 0
+        lines = [f"FPS: {1 / average if average else 0:.0f}   frame: {average * 1000:.2f} ms"]
+        lines += [f"{name}: {seconds * 1000:.2f} ms" for name, seconds in profiler.last_timers.items()]
+        lines += [f"{name}: {amount}" for name, amount in profiler.last_counters.items()]
+        y = graph.bottom + 8
+        for line in lines:
+            self.panel.blit(TEXT.render_glyphs(self.font, line, COLORS['white']), (graph.left, y))
+            y += 18
+        self.renderer.overlay(self.panel, (10, 10))
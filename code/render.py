@@ -0,0 +1,83 @@
+from settings import *
+from weakref import WeakKeyDictionary
+
+# render backends for the world view, picked with RENDER_BACKEND:
+#   'software'  blits onto the display surface (the original path)
+#   'texture'   pygame._sdl2 Window/Renderer, every surface is uploaded to a texture once and drawn by the renderer,
+#               so alpha blending (shadows, the fade) happens in the renderer instead of per pixel on the cpu
+# both take the same (surface, dest) sequences, create_renderer falls back to software if the texture path fails
+
+class SoftwareRenderer:
+    def __init__(self, size, title):
+        self.surface = pygame.display.set_mode(size)
+        pygame.display.set_caption(title)
+        self.tint_surf = pygame.Surface(size)
+
+    def clear(self, color):
+        self.surface.fill(color)
+
+    def blits(self, blits):
+        self.surface.blits(blits, doreturn = False)
+
+    def overlay(self, surf, pos):
+        self.surface.blit(surf, pos)
+
+    def fade(self, alpha):
+        self.tint_surf.set_alpha(alpha)
+        self.surface.blit(self.tint_surf, (0,0))
+
+    def present(self):
+        pygame.display.update()
+
+class TextureRenderer:
+    def __init__(self, size, title):
+        from pygame._sdl2.video import Window, Renderer, Texture
+        self.texture_type = Texture
+        # a hidden display mode keeps convert()/convert_alpha() working for asset loading,
+        # the renderer draws into its own window (a window can't have both a surface and a renderer)
+        self.surface = None
+        pygame.display.set_mode((1,1), pygame.HIDDEN)
+        self.window = Window(title, size)
+        self.renderer = Renderer(self.window)
+        self.size = size
+        # one texture per root surface, atlas frames and water blocks draw from their parent's texture
+        self.textures = WeakKeyDictionary()
+
+    def texture(self, surf):
+        root = surf.get_abs_parent()
+        texture = self.textures.get(root)
+        if texture is None:
+            texture = self.textures[root] = self.texture_type.from_surface(self.renderer, root)
+        return texture
+
+    def clear(self, color):
+        self.renderer.draw_color = pygame.Color(color)
+        self.renderer.clear()
+
+    def blits(self, blits):
+        for surf, (x, y) in blits:
+            left, top = surf.get_abs_offset()
+            width, height = surf.get_size()
+            # int() truncates like Surface.blit does with float positions
+            self.texture(surf).draw((left, top, width, height), (int(x), int(y), width, height))
+
+    def overlay(self, surf, pos):
+        # overlays change every frame, so they are uploaded fresh instead of cached
+        self.texture_type.from_surface(self.renderer, surf).draw(dstrect = pos)
+
+    def fade(self, alpha):
+        if alpha > 0:
+            self.renderer.draw_blend_mode = 1 # SDL_BLENDMODE_BLEND
+            self.renderer.draw_color = (0, 0, 0, int(alpha))
+            self.renderer.fill_rect((0, 0, *self.size))
+
+    def present(self):
+        self.renderer.present()
+
+def create_renderer(size, title, backend = RENDER_BACKEND):
+    if backend == 'texture':
+        try:
+            return TextureRenderer(size, title)
+        except Exception as e:
+            print('texture renderer unavailable, falling back to software:', e)
+    return SoftwareRenderer(size, title)
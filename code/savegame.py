@@ -0,0 +1,65 @@
+from settings import *
+from os import fsync, makedirs, replace
+
+# crash safe saves: a json snapshot that is only ever replaced atomically (temp file + rename), plus a
+# journal of compact deltas appended while playing and replayed over the snapshot on load.
+# deltas hold absolute values, so replaying one that already made it into the snapshot is harmless
+
+class SaveFile:
+    def __init__(self, path, snapshot_every = SNAPSHOT_EVERY):
+        self.path = path
+        self.journal_path = path + '.journal'
+        self.snapshot_every = snapshot_every
+        self.state = {}
+        self.journal = None
+        self.entries = 0
+
+    def load(self):
+        self.state = {}
+        if exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.state = json.load(f)
+        if exists(self.journal_path):
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        self.state.update(json.loads(line))
+                    except ValueError:
+                        # torn last line from a crash mid append
+                        break
+            # fold the journal into a fresh snapshot so new deltas never follow a torn line
+            self.snapshot()
+        return dict(self.state)
+
+    def record(self, values):
+        delta = {key: value for key, value in values.items() if self.state.get(key) != value}
+        if not delta:
+            return
+        self.state.update(delta)
+        if self.journal is None:
+            makedirs(dirname(self.path) or '.', exist_ok = True)
+            self.journal = open(self.journal_path, 'a', encoding='utf-8')
+        self.journal.write(json.dumps(delta, separators = (',', ':')) + '\n')
+        self.journal.flush()
+        self.entries += 1
+        if self.entries >= self.snapshot_every:
+            self.snapshot()
+
+    def snapshot(self):
+        makedirs(dirname(self.path) or '.', exist_ok = True)
+        temp = self.path + '.tmp'
+        with open(temp, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, indent=2)
+            f.flush()
+            fsync(f.fileno())
+        replace(temp, self.path)
+
+        # everything journaled so far is part of the snapshot now
+        if self.journal:
+            self.journal.close()
+            self.journal = None
+        open(self.journal_path, 'w').close()
+        self.entries = 0
+
+    def close(self):
+        self.snapshot()
@@ -6,8 +6,32 @@ from os.path import join, dirname, exists
 
 WINDOW_WIDTH, WINDOW_HEIGHT = 1280-120, 720-120
 TILE_SIZE = 64
+TERRAIN_CHUNK_SIZE = 16
+TERRAIN_CACHE_CHUNKS = 12
+WATER_CHUNK_SIZE = 8
+RENDER_CELL_SIZE = TILE_SIZE * 4
+ACTIVITY_REGION_SIZE = TILE_SIZE * 8
+ACTIVITY_MARGIN = TILE_SIZE * 4
+TRIGGER_CELL_SIZE = TILE_SIZE * 2
+ATLAS_SIZE = 2048
 ANIMATION_SPEED = 6
+SIMULATION_STEP = 1 / 120
+MAX_FRAME_TIME = 0.25
+FRAME_CAP = 60
+RENDER_BACKEND = 'software' # or 'texture' for the pygame._sdl2 renderer
 BATTLE_OUTLINE_WIDTH = 4
+MAP_CACHE_DIR = join('..', 'data', 'cache')
+IMAGE_CACHE_DIR = join(MAP_CACHE_DIR, 'images')
+ASSET_PACK_PATH = join('..', 'data', 'assets.kpak')
+ASSET_PACK_CHECK = False # True while editing assets: stat every packed source on startup and skip a stale pack
+RESIDENT_MAPS = 8
+WORLD_CACHE_BUDGET = 192 * 1024 * 1024
+WORLD_SPRITE_BYTES = 1024
+PROFILER_HISTORY = 120
+TEXT_CACHE_SIZE = 256
+WORLD_SAVE_PATH = join('..', 'data', 'saves', 'world.json')
+SAVE_INTERVAL = 1
+SNAPSHOT_EVERY = 120
 
 COLORS = {
 	'white': '#f4fefa', 
@@ -0,0 +1,72 @@
+from settings import *
+from entities import Entity
+
+class SpatialHash:
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.items = {}
+
+    def cells_for(self, rect):
+        size = self.cell_size
+        left, top = int(rect.left // size), int(rect.top // size)
+        right = max(left, int(-(-rect.right // size)) - 1)
+        bottom = max(top, int(-(-rect.bottom // size)) - 1)
+        return [(x, y) for x in range(left, right + 1) for y in range(top, bottom + 1)]
+
+    def insert(self, item, rect):
+        cells = self.cells_for(rect)
+        self.items[item] = cells
+        for cell in cells:
+            self.cells.setdefault(cell, {})[item] = None
+
+    def remove(self, item):
+        for cell in self.items.pop(item, ()):
+            bucket = self.cells[cell]
+            del bucket[item]
+            if not bucket:
+                del self.cells[cell]
+
+    def query(self, rect):
+        return self.query_cells(self.cells_for(rect))
+
+    def query_cells(self, cells):
+        found = {}
+        for cell in cells:
+            if cell in self.cells:
+                found.update(self.cells[cell])
+        return list(found)
+
+    def clear(self):
+        self.cells.clear()
+        self.items.clear()
+
+    def __contains__(self, item):
+        return item in self.items
+
+    def __len__(self):
+        return len(self.items)
+
+class CollisionIndex:
+    def __init__(self, cell_size = TILE_SIZE):
+        # static hitboxes are hashed once per map, moving entities are checked directly
+        self.static = SpatialHash(cell_size)
+        self.moving = {}
+        self.order = {}
+
+    def build(self, sprites):
+        self.static.clear()
+        self.moving.clear()
+        self.order.clear()
+        for index, sprite in enumerate(sprites):
+            self.order[sprite] = index
+            if isinstance(sprite, Entity):
+                self.moving[sprite] = None
+            else:
+                self.static.insert(sprite, sprite.hitbox)
+
+    def nearby(self, rect):
+        sprites = self.static.query(rect)
+        sprites.extend(self.moving)
+        sprites.sort(key = self.order.get)
+        return sprites
@@ -1,4 +1,5 @@
 from settings import *
+from collections import OrderedDict
 
 class Sprite(pygame.sprite.Sprite):
     def __init__(self, pos, surf, groups, z = WORLD_LAYERS['main']):
@@ -7,17 +8,21 @@ class Sprite(pygame.sprite.Sprite):
         self.rect = self.image.get_frect(topleft = pos)
         self.z = z
         self.y_sort = self.rect.centery
-        self.hitbox = self.rect.copy()
 
-class BorderSprite(Sprite):
-    def __init__(self, pos, surf, groups):
-        super().__init__(pos, surf, groups)
-        self.hitbox = self.rect.copy()
+# invisible map objects are plain slotted records kept in flat per map tables (Game.colliders,
+# Game.transition_zones), not sprites: no surface, no group bookkeeping, no __dict__
+# sizes are truncated the way the surfaces these used to carry truncated them
+class Border:
+    __slots__ = ('hitbox',)
 
-class TransitionSprite(Sprite):
-    def __init__(self, pos, size, target, groups):
-        surf = pygame.Surface(size)
-        super().__init__(pos, surf, groups)
+    def __init__(self, pos, size):
+        self.hitbox = pygame.FRect(pos, (int(size[0]), int(size[1])))
+
+class TransitionZone:
+    __slots__ = ('rect', 'target')
+
+    def __init__(self, pos, size, target):
+        self.rect = pygame.FRect(pos, (int(size[0]), int(size[1])))
         self.target = target
 
 class CollidableSprite(Sprite):
@@ -31,15 +36,61 @@ class MonsterPatchSprite(Sprite):
         super().__init__(pos, surf, groups, WORLD_LAYERS['main' if biome != 'sand' else 'bg'])
         self.y_sort -= 40
 
+class TerrainCache:
+    # baked terrain chunk surfaces of every map, least recently drawn first. only TERRAIN_CACHE_CHUNKS are
+    # kept, so terrain memory depends on what is on screen instead of on map area
+    def __init__(self, capacity = TERRAIN_CACHE_CHUNKS):
+        self.capacity = capacity
+        self.surfaces = OrderedDict()
+
+    def get(self, chunk):
+        surf = self.surfaces.get(chunk)
+        if surf is None:
+            surf = self.surfaces[chunk] = chunk.bake()
+            while len(self.surfaces) > self.capacity:
+                self.surfaces.popitem(last = False)
+        else:
+            self.surfaces.move_to_end(chunk)
+        return surf
+
+class TerrainChunk(pygame.sprite.Sprite):
+    # a block of static terrain tiles, baked into one surface the first time it is drawn
+    def __init__(self, pos, size, tiles, groups, cache, z = WORLD_LAYERS['bg']):
+        super().__init__(groups)
+        self.rect = pygame.FRect(pos, size)
+        self.tiles = tiles
+        self.cache = cache
+        self.z = z
+        self.y_sort = self.rect.centery
+
+    @property
+    def image(self):
+        return self.cache.get(self)
+
+    def bake(self):
+        surf = pygame.Surface(self.rect.size, pygame.SRCALPHA)
+        surf.blits(self.tiles, doreturn = False)
+        return surf
+
+class AnimationClock:
+    def __init__(self, speed = ANIMATION_SPEED):
+        # one shared frame index for every tile animation, advanced once per tick
+        self.speed = speed
+        self.time = 0
+        self.index = 0
+
+    def tick(self, dt):
+        self.time += dt
+        self.index = int(self.time * self.speed)
+
 class AnimatedSprite(Sprite):
-    def __init__(self, pos, frames, groups, z):
-        self.frame_index = 0
+    def __init__(self, pos, frames, groups, z, clock):
         self.frames = frames
-        super().__init__(pos, frames[self.frame_index], groups, z)
+        self.clock = clock
+        super().__init__(pos, frames[clock.index % len(frames)], groups, z)
 
     def animate(self, dt):
-        self.frame_index += ANIMATION_SPEED * dt
-        self.image = self.frames[int (self.frame_index % len(self.frames))]
+        self.image = self.frames[self.clock.index % len(self.frames)]
     
     def update(self, dt):
         self.animate(dt)
\ No newline at end of file
@@ -1,31 +1,28 @@
 from settings import *
 from os.path import join
-from os import walk
-from pytmx.util_pygame import load_pygame
+from pack import walk
+from assets import load_images
 
 # imports 
 def import_image(*path, alpha = True, format = 'png'):
 	full_path = join(*path) + f'.{format}'
-	surf = pygame.image.load(full_path).convert_alpha() if alpha else pygame.image.load(full_path).convert()
+	surf = load_images([full_path], alpha)[0]
 	return surf
 
 def import_folder(*path):
-	frames = []
+	paths = []
 	for folder_path, sub_folders, image_names in walk(join(*path)):
 		for image_name in sorted(image_names, key = lambda name: int(name.split('.')[0])):
-			full_path = join(folder_path, image_name)
-			surf = pygame.image.load(full_path).convert_alpha()
-			frames.append(surf)
-	return frames
+			paths.append(join(folder_path, image_name))
+	return load_images(paths)
 
 def import_folder_dict(*path):
-	frames = {}
+	names, paths = [], []
 	for folder_path, sub_folders, image_names in walk(join(*path)):
 		for image_name in image_names:
-			full_path = join(folder_path, image_name)
-			surf = pygame.image.load(full_path).convert_alpha()
-			frames[image_name.split('.')[0]] = surf
-	return frames
+			names.append(image_name.split('.')[0])
+			paths.append(join(folder_path, image_name))
+	return dict(zip(names, load_images(paths)))
 
 def import_sub_folders(*path):
 	frames = {}
@@ -36,19 +33,60 @@ def import_sub_folders(*path):
 	return frames
 
 def import_tilemap(cols, rows, *path):
+	return tilemap_frames(import_image(*path), cols, rows)
+
+def tilemap_frames(surf, cols, rows):
+	# frames are zero-copy subsurfaces of the per-pixel alpha sheet
 	frames = {}
-	surf = import_image(*path)
 	cell_width, cell_height = surf.get_width() / cols, surf.get_height() / rows
 	for col in range(cols):
 		for row in range(rows):
 			cutout_rect = pygame.Rect(col * cell_width, row * cell_height,cell_width,cell_height)
-			cutout_surf = pygame.Surface((cell_width, cell_height))
-			cutout_surf.fill('green')
-			cutout_surf.set_colorkey('green')
-			cutout_surf.blit(surf, (0,0), cutout_rect)
-			frames[(col, row)] = cutout_surf
+			frames[(col, row)] = surf.subsurface(cutout_rect)
 	return frames
 
+def collect_frames(frames, found):
+	if isinstance(frames, pygame.Surface):
+		found[id(frames)] = frames
+	else:
+		for value in (frames.values() if isinstance(frames, dict) else frames):
+			collect_frames(value, found)
+
+def replace_frames(frames, packed):
+	if isinstance(frames, pygame.Surface):
+		return packed[id(frames)]
+	if isinstance(frames, dict):
+		return {key: replace_frames(value, packed) for key, value in frames.items()}
+	return [replace_frames(value, packed) for value in frames]
+
+def pack_atlas(frames, size = ATLAS_SIZE):
+	# shelf-packs every surface in a nested dict/list of frames into a few large pages
+	# and returns the same structure with each surface swapped for a subsurface of its page
+	surfs = {}
+	collect_frames(frames, surfs)
+	placements, extents = {}, [[0, 0]]
+	x = y = shelf_height = 0
+	for key, surf in sorted(surfs.items(), key = lambda item: item[1].get_height(), reverse = True):
+		width, height = surf.get_size()
+		if x + width > size:
+			x, y, shelf_height = 0, y + shelf_height, 0
+		if y + height > size and (x or y):
+			extents.append([0, 0])
+			x = y = shelf_height = 0
+		placements[key] = (len(extents) - 1, x, y)
+		extents[-1] = [max(extents[-1][0], x + width), max(extents[-1][1], y + height)]
+		x += width
+		shelf_height = max(shelf_height, height)
+
+	pages = [pygame.Surface(extent, pygame.SRCALPHA).convert_alpha() for extent in extents]
+	packed = {}
+	for key, (page, x, y) in placements.items():
+		surf = surfs[key]
+		# additive blit onto a cleared page copies the pixels and alpha exactly
+		pages[page].blit(surf, (x, y), special_flags = pygame.BLEND_RGBA_ADD)
+		packed[key] = pages[page].subsurface((x, y, *surf.get_size()))
+	return replace_frames(frames, packed)
+
 def coast_importer(cols, rows, *path):
 	frame_dict = import_tilemap(cols, rows, *path)
 	new_dict = {}
@@ -70,7 +108,9 @@ def coast_importer(cols, rows, *path):
 	return new_dict
 
 def character_importer(cols, rows, *path):
-	frame_dict = import_tilemap(cols, rows, *path)
+	return character_frames(import_tilemap(cols, rows, *path), cols)
+
+def character_frames(frame_dict, cols):
 	new_dict = {}
 	for row, direction in enumerate(('down','left','right','up')):
 		new_dict[direction] = [frame_dict[(col,row)] for col in range(cols)]
@@ -78,16 +118,39 @@ def character_importer(cols, rows, *path):
 	return new_dict
 
 def all_character_import(*path):
-	new_dict = {}
+	# every sheet is decoded in one parallel batch, then sliced
+	names, paths = [], []
 	for folder_path, sub_folders, image_names in walk(join(*path)):
 		for image in image_names:
-			image_name = image.split(".")[0]
-			new_dict[image_name] = character_importer(4,4,*path, image_name)
-	return new_dict
+			names.append(image.split(".")[0])
+			paths.append(join(folder_path, image))
+	return {name: character_frames(tilemap_frames(surf, 4, 4), 4) for name, surf in zip(names, load_images(paths))}
+
+def tiled_frames(frames, tiles):
+	# repeats each frame over a tiles x tiles sheet so a whole block of water can share one surface per frame
+	sheets = []
+	for frame in frames:
+		width, height = frame.get_size()
+		sheet = pygame.Surface((width * tiles, height * tiles), pygame.SRCALPHA)
+		for col in range(tiles):
+			for row in range(tiles):
+				sheet.blit(frame, (col * width, row * height), special_flags = pygame.BLEND_RGBA_ADD)
+		sheets.append(sheet.convert_alpha())
+	return sheets
 
-def tmx_importer(*path):
-	tmx_dict = {}
-	for folder_path, sub_folders, file_names in walk(join(*path)):
-		for file in file_names:
-			tmx_dict[file.split('.')[0]] = load_pygame(join(folder_path, file))
-		return tmx_dict
+def terrain_chunks(tmx_map, layers, chunk_size = TERRAIN_CHUNK_SIZE):
+	# groups the static tile layers into chunk_size x chunk_size blocks of tile blits, ((width, height), [(surf, pos) ...]),
+	# TerrainChunk bakes a block into one surface only once it is on screen
+	chunks = {}
+	for layer in layers:
+		if layer not in tmx_map.layernames:
+			continue
+		for x, y, surf in tmx_map.get_layer_by_name(layer).tiles():
+			col, row = x // chunk_size, y // chunk_size
+			if (col, row) not in chunks:
+				width = min(chunk_size, tmx_map.width - col * chunk_size) * TILE_SIZE
+				height = min(chunk_size, tmx_map.height - row * chunk_size) * TILE_SIZE
+				chunks[(col, row)] = ((width, height), [])
+			chunks[(col, row)][1].append((surf, ((x - col * chunk_size) * TILE_SIZE, (y - row * chunk_size) * TILE_SIZE)))
+	chunk_pixels = chunk_size * TILE_SIZE
+	return {(col * chunk_pixels, row * chunk_pixels): chunk for (col, row), chunk in chunks.items()}
@@ -0,0 +1,38 @@
+import os
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import random
+from min_pet_ui import Pet
+
+# catch_up must land where pass_time gets to frame by frame, over random states and absences.
+# a frame at 1/240s moves a stat by at most 0.0025, the closed form is held to a few of those
+# run from code/: python -m pytest -q
+
+STATS = ('hunger', 'happiness', 'energy', 'cleanliness', 'health')
+STEP = 1 / 240
+TOLERANCE = 0.01
+
+def random_pet(rng):
+    pet = Pet()
+    for stat in STATS:
+        # land on the thresholds pass_time branches on as well as between them
+        setattr(pet, stat, rng.choice([rng.uniform(0, 100), 0, 10, 15, 25, 50, 60, 100]))
+    return pet
+
+def test_catch_up_matches_pass_time():
+    rng = random.Random(15)
+    for _ in range(40):
+        stepped = random_pet(rng)
+        caught_up = Pet.from_dict(stepped.to_dict())
+        seconds = rng.choice([1, 30, 100, 300, 600])
+        for _ in range(round(seconds / STEP)):
+            stepped.pass_time(STEP)
+        caught_up.catch_up(seconds)
+        for stat in STATS:
+            assert abs(getattr(caught_up, stat) - getattr(stepped, stat)) < TOLERANCE, (stat, seconds, stepped.to_dict())
+
+def test_catch_up_of_nothing_changes_nothing():
+    pet = random_pet(random.Random(0))
+    before = pet.to_dict()
+    pet.catch_up(0)
+    assert pet.to_dict() == before
@@ -0,0 +1,61 @@
+import os
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import random
+import numpy as np
+from min_pet_ui import Pet
+from petstore import PetStore, PetView, STATS
+
+# the batched PetStore has to keep doing exactly what the same pets do one Pet at a time:
+# a random mix of time steps and care actions on a shared population is compared pet by pet
+# run from code/: python -m pytest -q
+
+ACTIONS = ('feed', 'play', 'rest', 'clean', 'health_check')
+
+def random_pets(rng, count):
+    pets = []
+    for i in range(count):
+        pet = Pet(f'pet{i}', rng.choice(['cat', 'dog', 'fish']))
+        for stat in STATS:
+            setattr(pet, stat, rng.choice([rng.uniform(0, 100), 0, 10, 15, 25, 50, 60, 100]))
+        pet.money = rng.randint(0, 30)
+        pets.append(pet)
+    return pets
+
+def assert_same(store, pets):
+    assert list(store.reactions()) == [pet.reaction() for pet in pets]
+    for index, pet in enumerate(pets):
+        stored, expected = store[index].to_dict(), pet.to_dict()
+        for key, value in expected.items():
+            if isinstance(value, (int, float)):
+                assert abs(stored[key] - value) < 1e-9, (index, key, stored[key], value)
+            else:
+                assert stored[key] == value, (index, key, stored[key], value)
+
+def test_store_matches_pets():
+    rng = random.Random(16)
+    pets = random_pets(rng, 100)
+    store = PetStore.from_pets([Pet.from_dict(pet.to_dict()) for pet in pets])
+    for step in range(600):
+        if rng.random() < 0.9:
+            seconds = rng.choice([1 / 60, 0.5, 3])
+            store.pass_time(seconds)
+            for pet in pets:
+                pet.pass_time(seconds)
+        else:
+            action = rng.choice(ACTIONS)
+            chosen = np.array(rng.sample(range(len(pets)), 20))
+            results = getattr(store, action)(chosen)
+            assert list(results[chosen]) == [getattr(pets[index], action)() for index in chosen], action
+        if step % 50 == 0:
+            assert_same(store, pets)
+    assert_same(store, pets)
+
+def test_views_round_trip():
+    rng = random.Random(1)
+    pets = random_pets(rng, 5)
+    store = PetStore.from_dicts([pet.to_dict() for pet in pets])
+    assert isinstance(store[2], PetView)
+    assert PetStore.from_dicts(store.to_dicts()).to_dicts() == store.to_dicts()
+    view = PetView.from_dict(pets[3].to_dict())
+    assert view.to_dict() == pets[3].to_dict()
@@ -0,0 +1,74 @@
+from settings import *
+from collections import OrderedDict
+
+# cached text rendering, shared by the pet ui and in-game text
+#   render(font, text, color)        strings that rarely change, kept in an lru of rendered surfaces
+#   render_glyphs(font, text, color) strings that change every few frames (money, stats, timers), composed
+#                                    from a per font/color glyph atlas so no font rasterization happens
+# glyphs are placed by their advance, which matches font.render for fonts without kerning (the pixel fonts)
+
+class TextCache:
+    def __init__(self, capacity = TEXT_CACHE_SIZE):
+        self.capacity = capacity
+        self.surfs = OrderedDict()
+        self.atlases = {}
+
+    def render(self, font, text, color, antialias = False):
+        key = (font, text, color, antialias)
+        if key in self.surfs:
+            self.surfs.move_to_end(key)
+            return self.surfs[key]
+        surf = font.render(text, antialias, color)
+        self.surfs[key] = surf
+        if len(self.surfs) > self.capacity:
+            self.surfs.popitem(last = False)
+        return surf
+
+    def render_glyphs(self, font, text, color, antialias = False):
+        key = (font, color, antialias)
+        if key not in self.atlases:
+            self.atlases[key] = GlyphAtlas(font, color, antialias)
+        return self.atlases[key].render(text)
+
+    def clear(self):
+        self.surfs.clear()
+        self.atlases.clear()
+
+class GlyphAtlas:
+    def __init__(self, font, color, antialias = False, chars = '0123456789$.,:-+%/ '):
+        self.font = font
+        self.color = color
+        self.antialias = antialias
+        self.areas = {}
+        self.surf = pygame.Surface((0, font.get_height()), pygame.SRCALPHA)
+        self.add(chars)
+
+    def add(self, chars):
+        chars = [char for char in dict.fromkeys(chars) if char not in self.areas]
+        if not chars:
+            return
+        glyphs = [self.font.render(char, self.antialias, self.color) for char in chars]
+        width = self.surf.get_width() + sum(glyph.get_width() for glyph in glyphs)
+        height = max([self.surf.get_height()] + [glyph.get_height() for glyph in glyphs])
+
+        # the atlas is a single row of glyphs, grown whenever a string brings in new characters
+        surf = pygame.Surface((width, height), pygame.SRCALPHA)
+        surf.blit(self.surf, (0, 0))
+        x = self.surf.get_width()
+        for char, glyph in zip(chars, glyphs):
+            surf.blit(glyph, (x, 0))
+            self.areas[char] = pygame.Rect(x, 0, glyph.get_width(), glyph.get_height())
+            x += glyph.get_width()
+        self.surf = surf
+
+    def render(self, text):
+        self.add(text)
+        surf = pygame.Surface(self.font.size(text), pygame.SRCALPHA)
+        x, blits = 0, []
+        for char, metrics in zip(text, self.font.metrics(text)):
+            blits.append((self.surf, (x, 0), self.areas[char]))
+            x += metrics[4] if metrics else self.areas[char].width
+        surf.blits(blits, doreturn = False)
+        return surf
+
+TEXT = TextCache()
@@ -0,0 +1,75 @@
+from settings import *
+from spatial import SpatialHash
+
+# trigger zones: every area the player can walk into (transition doors, monster patches, later npc
+# interaction radii) is hashed once per map under a kind and a tag (the door target, the patch biome ...).
+# the nearby zones are only looked up again when the player's hitbox crosses into other cells, between
+# that the few nearby ones are tested directly, and with none nearby a step costs a single cells_for
+#   events = triggers.update(player.hitbox)  ->  [('enter' | 'stay' | 'exit', kind, zone), ...]
+#   triggers.inside('transition')            ->  zones the player overlaps, in map order
+#   triggers.occupancy('monsters')           ->  {biome: number of patches the player stands in}
+
+class TriggerIndex:
+    def __init__(self, cell_size = TRIGGER_CELL_SIZE):
+        self.hash = SpatialHash(cell_size)
+        # zone -> (kind, tag, rect, map order)
+        self.zones = {}
+        self.reset()
+
+    def add(self, zone, kind, tag = None, rect = None):
+        rect = rect or zone.rect
+        self.zones[zone] = (kind, tag, rect, len(self.zones))
+        self.hash.insert(zone, rect)
+        self.cells = None
+
+    def remove(self, zone):
+        if zone in self.zones:
+            self.hash.remove(zone)
+            del self.zones[zone]
+            self.reset()
+
+    def reset(self):
+        # forget where the player was, the next update reports every zone it stands in as entered
+        self.cells = None
+        self.nearby = []
+        self.current = {}
+        self.counts = {}
+
+    def update(self, rect):
+        cells = self.hash.cells_for(rect)
+        if cells != self.cells:
+            self.cells = cells
+            self.nearby = sorted(self.hash.query_cells(cells), key = lambda zone: self.zones[zone][3])
+        if not self.nearby and not self.current:
+            return []
+
+        current = {zone: None for zone in self.nearby if self.zones[zone][2].colliderect(rect)}
+        events = []
+        for zone in self.current:
+            if zone not in current:
+                events.append(('exit', self.zones[zone][0], zone))
+                self.count(zone, -1)
+        for zone in current:
+            if zone in self.current:
+                events.append(('stay', self.zones[zone][0], zone))
+            else:
+                events.append(('enter', self.zones[zone][0], zone))
+                self.count(zone, 1)
+        self.current = current
+        return events
+
+    def count(self, zone, amount):
+        kind, tag, _, _ = self.zones[zone]
+        tags = self.counts.setdefault(kind, {})
+        tags[tag] = tags.get(tag, 0) + amount
+        if not tags[tag]:
+            del tags[tag]
+
+    def inside(self, kind):
+        return [zone for zone in self.current if self.zones[zone][0] == kind]
+
+    def occupancy(self, kind):
+        return self.counts.get(kind, {})
+
+    def __len__(self):
+        return len(self.zones)
@@ -0,0 +1,62 @@
+from settings import *
+from collections import OrderedDict
+from groups import AllSprites
+from spatial import CollisionIndex
+from triggers import TriggerIndex
+
+# fully built maps (sprites, colliders, transition zones, collision index, trigger zones, player) kept around after leaving
+# them, so walking back through a door only switches the active instance and moves the player to the spawn
+
+class WorldInstance:
+    def __init__(self, map_name, renderer):
+        self.map_name = map_name
+        self.all_sprites = AllSprites(renderer)
+        # everything the player collides with / can walk into, in map order
+        self.colliders = []
+        self.transition_zones = []
+        self.collision_index = CollisionIndex()
+        # transition zones and monster patches the player can walk into
+        self.triggers = TriggerIndex()
+        # Entities spawn points: pos property -> (center, facing direction)
+        self.spawns = {}
+        self.player = None
+        self.size = 0
+
+    def estimate_size(self):
+        # frames come from shared atlas pages and baked terrain lives in the shared, bounded TerrainCache,
+        # so a world only costs its sprites
+        self.size = len(self.all_sprites) * WORLD_SPRITE_BYTES
+
+class WorldCache:
+    def __init__(self, budget = WORLD_CACHE_BUDGET, release = None):
+        self.budget = budget
+        # called with the name of every evicted map, so whatever else holds on to it (the MapLoader and its
+        # terrain layout) lets go too and this cache alone decides what stays in memory
+        self.release = release
+        self.worlds = OrderedDict()
+        self.active = None
+
+    def get(self, map_name):
+        world = self.worlds.get(map_name)
+        if world:
+            self.worlds.move_to_end(map_name)
+        return world
+
+    def add(self, world):
+        self.worlds[world.map_name] = world
+        self.worlds.move_to_end(world.map_name)
+        self.evict()
+
+    def evict(self):
+        # least recently visited first, the active map always stays
+        total = sum(world.size for world in self.worlds.values())
+        for map_name in list(self.worlds):
+            if total <= self.budget:
+                break
+            if map_name != self.active:
+                total -= self.worlds.pop(map_name).size
+                if self.release:
+                    self.release(map_name)
+
+    def __contains__(self, map_name):
+        return map_name in self.worlds